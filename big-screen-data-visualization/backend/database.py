@@ -1,5 +1,6 @@
 from sqlalchemy import (
     create_engine,
+    event,
     Column,
     Integer,
     String,
@@ -8,16 +9,65 @@ from sqlalchemy import (
     JSON,
     ForeignKey,
 )
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./situational_dashboard.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# 元数据库 SQLite 调优：WAL 模式下读不阻塞写、写不阻塞读
+SQLITE_BUSY_TIMEOUT = 5000  # ms，写锁冲突时等待而不是立即报 "database is locked"
+SQLITE_CACHE_SIZE = -16000  # KiB（负数表示按大小），每个连接约 16 MB 页缓存
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+# 常驻连接：写连接池较小（SQLite 同一时刻只有一个写者），读连接池按并发请求数配置。
+# 溢出上限留得较宽：请求在事件循环中同步取连接，池耗尽会阻塞整个循环
+WRITE_POOL_SIZE = 4
+WRITE_MAX_OVERFLOW = 16
+READ_POOL_SIZE = 8
+READ_MAX_OVERFLOW = 32
+POOL_TIMEOUT = 10  # seconds
+
+
+def _apply_pragmas(dbapi_connection, read_only: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        if not read_only:
+            # journal_mode 持久化在数据库文件中，由写连接设置
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def create_sqlite_engine(url: str, read_only: bool = False) -> Engine:
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT / 1000},
+        pool_size=READ_POOL_SIZE if read_only else WRITE_POOL_SIZE,
+        max_overflow=READ_MAX_OVERFLOW if read_only else WRITE_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+    )
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, read_only)
+
+    return sqlite_engine
+
+
+engine = create_sqlite_engine(SQLALCHEMY_DATABASE_URL)
+# 只读路径（列表、详情、大屏渲染）使用独立连接池，不与写操作争用连接
+read_engine = create_sqlite_engine(SQLALCHEMY_DATABASE_URL, read_only=True)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -28,3 +78,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
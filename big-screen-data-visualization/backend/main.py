@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 import uvicorn
 import os
-from fastapi.staticfiles import StaticFiles
+from sqlalchemy import inspect, text
 
 from database import SessionLocal, engine
 import models
@@ -18,16 +18,61 @@ from routers import (
     users as users_router,
     assets as assets_router,
 )
+from utils import alarm_counters
+from utils.alarm_coalescer import alarm_coalescer
+from utils.alarm_ingest import alarm_queue
+from utils.asset_store import ASSET_MAX_BYTES, ASSET_MULTIPART_OVERHEAD, UPLOAD_DIR
+from utils.asset_variants import AssetStaticFiles
+from utils.body_limit import BodySizeLimitMiddleware
+from utils.compression import CompressionMiddleware
+from utils.db_engine import dispose_all_engines
+from utils.json_response import FastJSONResponse
+from utils.password_hashing import shutdown_password_pool
+from utils.query_executor import shutdown_executor
+from utils.scheduler import refresh_scheduler
+from utils.system_sampler import system_sampler
 
 models.Base.metadata.create_all(bind=engine)
+# create_all 不会为已存在的表补列：旧库升级时手动添加
+COLUMN_MIGRATIONS = {
+    "alarms": {
+        "occurrences": "ALTER TABLE alarms ADD COLUMN occurrences INTEGER NOT NULL DEFAULT 1",
+        "last_seen": "ALTER TABLE alarms ADD COLUMN last_seen DATETIME",
+    },
+    "users": {
+        "token_version": "ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0",
+    },
+}
+_inspector = inspect(engine)
+with engine.begin() as conn:
+    for table_name, migrations in COLUMN_MIGRATIONS.items():
+        existing = {c["name"] for c in _inspector.get_columns(table_name)}
+        for column, ddl in migrations.items():
+            if column not in existing:
+                conn.execute(text(ddl))
+                if (table_name, column) == ("alarms", "last_seen"):
+                    conn.execute(text("UPDATE alarms SET last_seen = created_at"))
+# create_all 不会为已存在的表补建索引
+for table in models.Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+with SessionLocal() as db:
+    alarm_counters.ensure_initialized(db)
 
-app = FastAPI(title="态势大屏 API", version="1.0.0")
+app = FastAPI(
+    title="态势大屏 API", version="1.0.0", default_response_class=FastJSONResponse
+)
 
 # Serve static files
-UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+app.mount("/uploads", AssetStaticFiles(directory=UPLOAD_DIR), name="uploads")
+
+# 在 multipart 解析前限制上传请求体大小（含没有 Content-Length 的分块上传）
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=ASSET_MAX_BYTES + ASSET_MULTIPART_OVERHEAD,
+    paths=["/api/assets/upload"],
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,7 +80,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Prev-Cursor"],
 )
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(datasources.router, prefix="/api/datasources", tags=["datasources"])
 app.include_router(datasets_router.router, prefix="/api/datasets", tags=["datasets"])
@@ -53,6 +100,27 @@ async def root():
     return {"message": "态势大屏 API"}
 
 
+@app.on_event("startup")
+async def start_background_tasks():
+    refresh_scheduler.start()
+    alarm_queue.start()
+    system_sampler.start()
+    alarm_coalescer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_background_tasks():
+    await system_sampler.stop()
+    await alarm_queue.stop()
+    await alarm_coalescer.stop()
+    with SessionLocal() as db:
+        alarm_coalescer.flush(db)
+    await refresh_scheduler.stop()
+    shutdown_executor()
+    shutdown_password_pool()
+    dispose_all_engines()
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
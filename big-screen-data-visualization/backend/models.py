@@ -7,6 +7,7 @@ from sqlalchemy import (
     JSON,
     ForeignKey,
     Boolean,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from database import Base
@@ -80,6 +81,23 @@ class Alarm(Base):
     source = Column(String(100))
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # 告警合并：窗口内的重复告警只累加次数并刷新最后出现时间
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
+    last_seen = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # 按时间倒序的游标分页
+        Index("ix_alarms_created_at_id", "created_at", "id"),
+        # 未读告警按级别筛选
+        Index("ix_alarms_is_read_level_created_at", "is_read", "level", "created_at"),
+    )
+
+
+class AlarmCounter(Base):
+    __tablename__ = "alarm_counters"
+
+    level = Column(String(20), primary_key=True)
+    unread = Column(Integer, nullable=False, default=0)
 
 
 class User(Base):
@@ -92,5 +110,7 @@ class User(Base):
     full_name = Column(String(100))
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
+    # 修改密码时递增，令牌中的 ver 不一致即失效
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,10 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from typing import List
-from database import SessionLocal
+from typing import List, Optional, Tuple
+from database import SessionLocal, get_read_db
 import models
 import schemas
 from datetime import datetime
+import base64
+from utils.alarm_counters import adjust_unread, unread_summary
+from utils.alarm_ingest import (
+    MAX_BATCH_SIZE,
+    QUEUE_FULL_RETRY_AFTER,
+    AlarmQueueFull,
+    alarm_queue,
+    insert_alarms,
+    publish_batch,
+)
+from utils.json_response import trusted_response
+from utils.pubsub import ALARMS_TOPIC, broker
 
 router = APIRouter()
 
@@ -17,22 +31,131 @@ def get_db():
         db.close()
 
 
+def _encode_cursor(alarm: models.Alarm) -> str:
+    raw = f"{alarm.created_at.isoformat()}|{alarm.id}"  # type: ignore
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, alarm_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(alarm_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/", response_model=List[schemas.Alarm])
-async def get_alarms(limit: int = 20, db: Session = Depends(get_db)):
-    return (
-        db.query(models.Alarm)
-        .order_by(models.Alarm.created_at.desc())
-        .limit(limit)
-        .all()
-    )
+async def get_alarms(
+    limit: int = Query(20, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    is_read: Optional[bool] = None,
+    level: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    # 基于 (created_at, id) 的游标分页，结果始终按时间倒序返回
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after")
+
+    query = db.query(models.Alarm)
+    if is_read is not None:
+        query = query.filter(models.Alarm.is_read.is_(is_read))
+    if level:
+        query = query.filter(models.Alarm.level == level)
+
+    if after:
+        created_at, alarm_id = _decode_cursor(after)
+        alarms = (
+            query.filter(
+                or_(
+                    models.Alarm.created_at > created_at,
+                    and_(
+                        models.Alarm.created_at == created_at,
+                        models.Alarm.id > alarm_id,
+                    ),
+                )
+            )
+            .order_by(models.Alarm.created_at.asc(), models.Alarm.id.asc())
+            .limit(limit)
+            .all()
+        )
+        alarms.reverse()
+    else:
+        if before:
+            created_at, alarm_id = _decode_cursor(before)
+            query = query.filter(
+                or_(
+                    models.Alarm.created_at < created_at,
+                    and_(
+                        models.Alarm.created_at == created_at,
+                        models.Alarm.id < alarm_id,
+                    ),
+                )
+            )
+        alarms = (
+            query.order_by(models.Alarm.created_at.desc(), models.Alarm.id.desc())
+            .limit(limit)
+            .all()
+        )
+
+    headers = {}
+    if alarms:
+        headers["X-Prev-Cursor"] = _encode_cursor(alarms[0])
+        headers["X-Next-Cursor"] = _encode_cursor(alarms[-1])
+    return trusted_response(alarms, schemas.Alarm, headers=headers)
+
+
+@router.get("/summary")
+async def get_alarm_summary(db: Session = Depends(get_read_db)):
+    unread = unread_summary(db)
+    return {"unread": unread, "total_unread": sum(unread.values())}
+
+
+@router.post("/batch")
+async def create_alarms_batch(
+    alarms: List[schemas.AlarmCreate], db: Session = Depends(get_db)
+):
+    if len(alarms) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BATCH_SIZE} alarms per batch",
+        )
+    rows = [alarm.dict() for alarm in alarms]
+    inserted = insert_alarms(db, rows)
+    if inserted:
+        publish_batch(rows)
+    return {"inserted": inserted}
 
 
 @router.post("/", response_model=schemas.Alarm)
-async def create_alarm(alarm: schemas.AlarmCreate, db: Session = Depends(get_db)):
+async def create_alarm(
+    alarm: schemas.AlarmCreate,
+    buffered: bool = False,
+    db: Session = Depends(get_db),
+):
+    if buffered:
+        # 写后缓冲：立即返回 202，由后台任务批量落库
+        try:
+            alarm_queue.enqueue(alarm.dict())
+        except AlarmQueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Alarm queue is full",
+                headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER)},
+            )
+        return JSONResponse(
+            {"queued": True, "pending": len(alarm_queue)},
+            status_code=status.HTTP_202_ACCEPTED,
+        )
+
     db_alarm = models.Alarm(**alarm.dict())
     db.add(db_alarm)
+    if not alarm.is_read:
+        adjust_unread(db, alarm.level, 1)
     db.commit()
     db.refresh(db_alarm)
+    broker.publish(ALARMS_TOPIC, "alarm", schemas.Alarm.model_validate(db_alarm))
     return db_alarm
 
 
@@ -41,6 +164,8 @@ async def mark_alarm_as_read(alarm_id: int, db: Session = Depends(get_db)):
     db_alarm = db.query(models.Alarm).filter(models.Alarm.id == alarm_id).first()
     if not db_alarm:
         raise HTTPException(status_code=404, detail="Alarm not found")
+    if not db_alarm.is_read:
+        adjust_unread(db, db_alarm.level, -1)  # type: ignore
     db_alarm.is_read = True
     db.commit()
     db.refresh(db_alarm)
@@ -1,32 +1,39 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-import os
-import uuid
-import shutil
+from fastapi.concurrency import run_in_threadpool
 
-router = APIRouter()
+from utils.asset_store import ASSET_MAX_BYTES, AssetTooLarge, asset_url, store_upload
+from utils.asset_variants import generate_variants
+
+# 除图片外允许上传 JSON（如 GeoJSON 地图数据）
+ALLOWED_CONTENT_TYPES = {"application/json"}
 
-# Use absolute path for safety
-UPLOAD_DIR = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads"
-)
+router = APIRouter()
 
 
 @router.post("/upload")
 async def upload_asset(file: UploadFile = File(...)):
     content_type = file.content_type
-    if not content_type or not content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Only image files are allowed")
-
-    # Generate unique filename
-    filename_orig = file.filename if file.filename else "unnamed.png"
-    _, ext = os.path.splitext(filename_orig)
-    filename = f"{uuid.uuid4()}{ext}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    if not content_type or not (
+        content_type.startswith("image/") or content_type in ALLOWED_CONTENT_TYPES
+    ):
+        raise HTTPException(status_code=400, detail="Only image or JSON files are allowed")
 
+    # 请求体大小已由 BodySizeLimitMiddleware 限制，这里按文件内容精确检查
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
+        filename, created = await store_upload(file)
+    except AssetTooLarge:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File exceeds the {ASSET_MAX_BYTES // (1024 * 1024)} MB limit",
+        )
+    except OSError as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
-    return {"url": f"http://localhost:8000/uploads/{filename}"}
+    if created:
+        try:
+            await run_in_threadpool(generate_variants, filename)
+        except Exception as e:
+            # 变体可在请求时按需生成，预生成失败不影响上传
+            print(f"Generating variants for {filename} failed: {e}")
+
+    return {"url": asset_url(filename), "deduplicated": not created}
@@ -1,20 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import Any, Dict, List, Optional
+import asyncio
+import time
 
-from database import get_db
+from database import ReadSessionLocal, get_db, get_read_db
 import models
 import schemas
+from utils.dashboard_documents import (
+    document_response,
+    get_dashboard_document,
+    invalidate_dashboard,
+)
+from utils.dataset_runner import (
+    DatasetQuery,
+    forget_widget,
+    load_dataset_data,
+    unwatch_widget,
+    watch_widget,
+)
+from utils.downsample import DownsampleError, widget_max_points
+from utils.json_response import FastJSONResponse, trusted_dict, trusted_response
+from utils.query_params import QueryParamError
+from utils.pubsub import (
+    ALARMS_TOPIC,
+    KEEPALIVE_FRAME,
+    KEEPALIVE_INTERVAL,
+    broker,
+    dataset_topic,
+    encode_event,
+    widget_topic,
+)
+from utils.scheduler import refresh_scheduler
+from utils.transforms import TransformError, transform_options
+from utils.query_executor import ClientDisconnected, cancel_on_disconnect
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[schemas.Dashboard])
 async def get_dashboards(
-    skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)
 ):
-    dashboards = db.query(models.Dashboard).offset(skip).limit(limit).all()
-    return dashboards
+    dashboards = (
+        db.query(models.Dashboard)
+        .options(selectinload(models.Dashboard.widgets))
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return trusted_response(dashboards, schemas.Dashboard)
 
 
 @router.post("/", response_model=schemas.Dashboard)
@@ -29,13 +65,275 @@ async def create_dashboard(
 
 
 @router.get("/{dashboard_id}", response_model=schemas.Dashboard)
-async def get_dashboard(dashboard_id: int, db: Session = Depends(get_db)):
+async def get_dashboard(
+    dashboard_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+):
+    doc = get_dashboard_document(db, dashboard_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Dashboard not found")
+    return document_response(doc.dashboard_body, doc.dashboard_etag, if_none_match)
+
+
+@router.get("/{dashboard_id}/render", response_model=schemas.DashboardRender)
+async def render_dashboard(
+    dashboard_id: int,
+    request: Request,
+    region: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
     dashboard = (
-        db.query(models.Dashboard).filter(models.Dashboard.id == dashboard_id).first()
+        db.query(models.Dashboard)
+        .options(selectinload(models.Dashboard.widgets))
+        .filter(models.Dashboard.id == dashboard_id)
+        .first()
     )
     if dashboard is None:
         raise HTTPException(status_code=404, detail="Dashboard not found")
-    return dashboard
+
+    # 多个组件共用的数据集只查询一次
+    dataset_ids = {w.dataset_id for w in dashboard.widgets if w.dataset_id is not None}
+    datasets = (
+        db.query(models.Dataset)
+        .options(joinedload(models.Dataset.datasource))
+        .filter(models.Dataset.id.in_(dataset_ids))
+        .all()
+        if dataset_ids
+        else []
+    )
+
+    # 配置了 transform 或 max_points 的组件单独取数（基础查询结果仍共享），结果放在 widget_data 中，
+    # 只有存在未配置二者的组件时数据集结果才放入 data
+    plain_ids = set()
+    shaped_widgets: List[Any] = []
+    errors: Dict[int, str] = {}
+    for widget in dashboard.widgets:
+        if widget.dataset_id is None:
+            continue
+        try:
+            points = widget_max_points(widget.config)
+        except DownsampleError as e:
+            errors[widget.id] = str(e)  # type: ignore
+            continue
+        if points or transform_options(widget.config):
+            shaped_widgets.append((widget, points))
+            continue
+        plain_ids.add(widget.dataset_id)
+    datasets_by_id = {ds.id: ds for ds in datasets}
+    plain_datasets = [ds for ds in datasets if ds.id in plain_ids]
+    shaped_widgets = [(w, p) for w, p in shaped_widgets if w.dataset_id in datasets_by_id]
+    # 等待数据集查询期间不占用元数据库连接（已加载的属性在关闭后仍可访问）
+    db.close()
+
+    try:
+        results = await cancel_on_disconnect(
+            request,
+            asyncio.gather(
+                *(
+                    load_dataset_data(ds, region)
+                    for ds in plain_datasets
+                ),
+                *(
+                    load_dataset_data(
+                        datasets_by_id[w.dataset_id],
+                        region,
+                        points,
+                        transform_options(w.config) or None,
+                    )
+                    for w, points in shaped_widgets
+                ),
+                return_exceptions=True,
+            ),
+        )
+    except ClientDisconnected:
+        return Response(status_code=499)
+
+    data: Dict[int, Any] = {}
+    dataset_errors: Dict[int, str] = {}
+    for ds, result in zip(plain_datasets, results):
+        if isinstance(result, Exception):
+            dataset_errors[ds.id] = f"Query execution failed: {result}"  # type: ignore
+        else:
+            data[ds.id] = result  # type: ignore
+
+    widget_data: Dict[int, Any] = {}
+    for (widget, _), result in zip(shaped_widgets, results[len(plain_datasets):]):
+        if isinstance(result, TransformError):
+            errors[widget.id] = f"Invalid transform: {result}"  # type: ignore
+        elif isinstance(result, Exception):
+            errors[widget.id] = f"Query execution failed: {result}"  # type: ignore
+        else:
+            widget_data[widget.id] = result  # type: ignore
+    for widget in dashboard.widgets:
+        if widget.dataset_id is None or widget.id in widget_data or widget.id in errors:
+            continue
+        if widget.dataset_id in dataset_errors:
+            errors[widget.id] = dataset_errors[widget.dataset_id]  # type: ignore
+        elif widget.dataset_id not in data:
+            errors[widget.id] = "Dataset not found"  # type: ignore
+
+    # 数据集结果可能很大：跳过 DashboardRender 的逐项校验，直接由 orjson 编码
+    return FastJSONResponse(
+        {
+            "dashboard": trusted_dict(dashboard, schemas.Dashboard),
+            "data": data,
+            "widget_data": widget_data,
+            "errors": errors,
+        }
+    )
+
+
+def _release_watches(watches: List[Any]) -> None:
+    for dataset_id, widget_id, watch in watches:
+        unwatch_widget(dataset_id, widget_id, watch)
+    watches.clear()
+
+
+@router.get("/{dashboard_id}/stream")
+async def stream_dashboard(dashboard_id: int, region: Optional[str] = None):
+    # 长连接不使用 get_db 依赖：会话在开始推送前关闭，不长期占用连接
+    db = ReadSessionLocal()
+    subscriber = None
+    watches: List[Any] = []
+    try:
+        dashboard = (
+            db.query(models.Dashboard).filter(models.Dashboard.id == dashboard_id).first()
+        )
+        if dashboard is None:
+            raise HTTPException(status_code=404, detail="Dashboard not found")
+        widgets = (
+            db.query(models.Widget.id, models.Widget.dataset_id, models.Widget.config)
+            .filter(
+                models.Widget.dashboard_id == dashboard_id,
+                models.Widget.dataset_id.isnot(None),
+            )
+            .all()
+        )
+        dataset_ids = {w.dataset_id for w in widgets}
+        datasets = (
+            db.query(models.Dataset)
+            .options(joinedload(models.Dataset.datasource))
+            .filter(models.Dataset.id.in_(dataset_ids))
+            .all()
+            if dataset_ids
+            else []
+        )
+        specs: Dict[int, DatasetQuery] = {}
+        for ds in datasets:
+            try:
+                spec = DatasetQuery.from_dataset(ds, region)
+            except QueryParamError:
+                # 参数无效的数据集在快照中单独报错，不影响其他数据集
+                continue
+            if spec is not None:
+                specs[ds.id] = spec  # type: ignore
+        # 与 render 相同：配置了 transform 或 max_points 的组件订阅各自的 widget 事件，
+        # 数据集事件只在存在未配置二者的组件时订阅
+        datasets_by_id = {ds.id: ds for ds in datasets}
+        plain_ids = set()
+        shaped_widgets = []
+        for widget in widgets:
+            if widget.dataset_id not in datasets_by_id:
+                continue
+            try:
+                points = widget_max_points(widget.config)
+            except DownsampleError:
+                # 配置无效的组件不推送，render 中单独报错
+                continue
+            steps = transform_options(widget.config)
+            if not steps and not points:
+                plain_ids.add(widget.dataset_id)
+                continue
+            shaped_widgets.append((widget, steps or None, points))
+            spec = specs.get(widget.dataset_id)
+            # 只配置了 max_points 的组件沿用数据集的默认变换
+            watch = watch_widget(
+                widget.dataset_id, widget.id, steps or (spec.transform if spec else []), points
+            )
+            watches.append((widget.dataset_id, widget.id, watch))
+        plain_datasets = [ds for ds in datasets if ds.id in plain_ids]
+
+        # 先订阅再加载快照，避免丢失加载期间的更新；只有 SQL 数据集会推送更新
+        topics = [dataset_topic(specs[ds.id].key) for ds in plain_datasets if ds.id in specs]
+        topics += [
+            widget_topic(w.id, specs[w.dataset_id].key)
+            for w, _, _ in shaped_widgets
+            if w.dataset_id in specs
+        ]
+        subscriber = broker.subscribe(topics + [ALARMS_TOPIC])
+        results = await asyncio.gather(
+            *(load_dataset_data(ds, region) for ds in plain_datasets),
+            *(
+                load_dataset_data(datasets_by_id[w.dataset_id], region, points, steps)
+                for w, steps, points in shaped_widgets
+            ),
+            return_exceptions=True,
+        )
+        # 快照事件中的 region 与推送事件一致，去重时按字节比较
+        regions = {ds_id: spec.bound_region() for ds_id, spec in specs.items()}
+        snapshot = [
+            encode_event(
+                "dataset",
+                {"dataset_id": ds.id, "region": regions.get(ds.id, region), "data": result},  # type: ignore
+            )
+            for ds, result in zip(plain_datasets, results)
+            if not isinstance(result, Exception)
+        ] + [
+            encode_event(
+                "widget",
+                {
+                    "widget_id": w.id,
+                    "dataset_id": w.dataset_id,
+                    "region": regions.get(w.dataset_id, region),
+                    "data": result,
+                },
+            )
+            for (w, _, _), result in zip(shaped_widgets, results[len(plain_datasets):])
+            if not isinstance(result, Exception)
+        ]
+    except BaseException:
+        if subscriber is not None:
+            broker.unsubscribe(subscriber)
+        _release_watches(watches)
+        raise
+    finally:
+        db.close()
+
+    async def events():
+        last_touch = time.monotonic()
+        try:
+            # 加载快照时已推送到队列的相同结果不再重复发送
+            pending = []
+            while not subscriber.queue.empty():
+                frame = subscriber.queue.get_nowait()
+                if frame not in snapshot:
+                    pending.append(frame)
+            for frame in snapshot + pending:
+                yield frame
+            while True:
+                try:
+                    frame = await asyncio.wait_for(
+                        subscriber.queue.get(), KEEPALIVE_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    frame = KEEPALIVE_FRAME
+                now = time.monotonic()
+                if now - last_touch >= KEEPALIVE_INTERVAL:
+                    # 有订阅者的数据集保持在后台预热范围内
+                    for spec in specs.values():
+                        refresh_scheduler.touch(spec)
+                    last_touch = now
+                yield frame
+        finally:
+            broker.unsubscribe(subscriber)
+            _release_watches(watches)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.put("/{dashboard_id}", response_model=schemas.Dashboard)
@@ -54,6 +352,7 @@ async def update_dashboard(
 
     db.commit()
     db.refresh(db_dashboard)
+    invalidate_dashboard(dashboard_id)
     return db_dashboard
 
 
@@ -67,15 +366,21 @@ async def delete_dashboard(dashboard_id: int, db: Session = Depends(get_db)):
 
     db.delete(db_dashboard)
     db.commit()
+    invalidate_dashboard(dashboard_id)
     return {"message": "Dashboard deleted successfully"}
 
 
 @router.get("/{dashboard_id}/widgets", response_model=List[schemas.Widget])
-async def get_dashboard_widgets(dashboard_id: int, db: Session = Depends(get_db)):
-    widgets = (
-        db.query(models.Widget).filter(models.Widget.dashboard_id == dashboard_id).all()
-    )
-    return widgets
+async def get_dashboard_widgets(
+    dashboard_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+):
+    doc = get_dashboard_document(db, dashboard_id)
+    if doc is None:
+        # 与原行为一致：不存在的大屏返回空组件列表
+        return []
+    return document_response(doc.widgets_body, doc.widgets_etag, if_none_match)
 
 
 @router.post("/{dashboard_id}/widgets", response_model=schemas.Widget)
@@ -86,6 +391,7 @@ async def create_widget(
     db.add(db_widget)
     db.commit()
     db.refresh(db_widget)
+    invalidate_dashboard(dashboard_id)
     return db_widget
 
 
@@ -103,6 +409,8 @@ async def update_widget(
 
     db.commit()
     db.refresh(db_widget)
+    invalidate_dashboard(db_widget.dashboard_id)  # type: ignore
+    forget_widget(widget_id)
     return db_widget
 
 
@@ -112,6 +420,9 @@ async def delete_widget(widget_id: int, db: Session = Depends(get_db)):
     if db_widget is None:
         raise HTTPException(status_code=404, detail="Widget not found")
 
+    dashboard_id = db_widget.dashboard_id
     db.delete(db_widget)
     db.commit()
+    invalidate_dashboard(dashboard_id)  # type: ignore
+    forget_widget(widget_id)
     return {"message": "Widget deleted successfully"}
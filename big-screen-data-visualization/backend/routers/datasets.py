@@ -1,19 +1,82 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Any, Dict, cast
 
-from database import get_db
+from database import get_db, get_read_db
 import models
 import schemas
-from utils.db_engine import execute_query
+from utils.db_engine import (
+    STREAM_MAX_BYTES,
+    STREAM_MAX_ROWS,
+    QueryTimeout,
+    encode_ndjson,
+    preview_query,
+    stream_query,
+)
+from utils.dataset_runner import (
+    DatasetQuery,
+    fetch_downsampled_result,
+    invalidate_dataset,
+    mock_dataset_data,
+    transform_mock_data,
+)
+from utils.downsample import MIN_POINTS, DownsampleError, widget_max_points
+from utils.json_response import FastJSONResponse, trusted_response
+from utils.query_executor import (
+    ClientDisconnected,
+    DatasourceBusy,
+    cancel_on_disconnect,
+    datasource_limiter,
+    iterate_in_executor,
+    run_query,
+)
+from utils.query_params import QueryParamError, declared_params, resolve_params
+from utils.query_result import (
+    ARROW_FORMAT,
+    ARROW_MEDIA_TYPE,
+    COLUMNAR_FORMAT,
+    COLUMNAR_JSON_MEDIA_TYPE,
+    MSGPACK_FORMAT,
+    MSGPACK_MEDIA_TYPE,
+    RECORDS_FORMAT,
+    QueryResult,
+    arrow_available,
+    negotiate_format,
+)
+from utils.scheduler import refresh_scheduler
+from utils.single_flight import query_flights
+from utils.transforms import TransformError, transform_options, validate_transform
 
 router = APIRouter()
 
 
+def _query_limit_error(e: Exception) -> HTTPException:
+    # 数据源并发与排队已满时快速返回 503，由客户端稍后重试；语句超时返回 504
+    if isinstance(e, DatasourceBusy):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+
+
 @router.get("/", response_model=List[schemas.Dataset])
-async def get_datasets(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_datasets(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     datasets = db.query(models.Dataset).offset(skip).limit(limit).all()
-    return datasets
+    return trusted_response(datasets, schemas.Dataset)
+
+
+@router.get("/refresh/status")
+async def get_refresh_status():
+    return refresh_scheduler.status()
+
+
+@router.get("/query-flights")
+async def get_query_flights():
+    # 并发相同查询的合并统计：executions 为实际执行次数，coalesced 为复用进行中查询的次数
+    return query_flights.stats()
 
 
 @router.post("/preview")
@@ -31,18 +94,27 @@ async def preview_dataset(
     query = dataset.query_config.get("query")
     if not query:
         raise HTTPException(status_code=400, detail="No query provided")
+    db.close()
 
     try:
         if str(datasource.type) in ["mysql", "postgresql", "sqlite"]:
-            data = execute_query(
+            # 预览时参数取声明的默认值
+            params = resolve_params(declared_params(query, dataset.query_config), {})
+            # LIMIT is pushed down to the database, preview cost is constant
+            return await run_query(
+                cast(int, datasource.id),
+                preview_query,
                 str(datasource.type),
                 cast(Dict[str, Any], datasource.connection_config),
                 query,
+                cast(int, datasource.id),
+                params=params,
+                connection_config=cast(Dict[str, Any], datasource.connection_config),
             )
-            # Limit to 10 rows for preview
-            return data[:10]
         else:
             return {"message": f"Preview for {datasource.type} not implemented"}
+    except (DatasourceBusy, QueryTimeout) as e:
+        raise _query_limit_error(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Query execution failed: {str(e)}")
 
@@ -57,7 +129,7 @@ async def create_dataset(dataset: schemas.DatasetCreate, db: Session = Depends(g
 
 
 @router.get("/{dataset_id}", response_model=schemas.Dataset)
-async def get_dataset(dataset_id: int, db: Session = Depends(get_db)):
+async def get_dataset(dataset_id: int, db: Session = Depends(get_read_db)):
     dataset = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
     if dataset is None:
         raise HTTPException(status_code=404, detail="Dataset not found")
@@ -80,6 +152,7 @@ async def update_dataset(
 
     db.commit()
     db.refresh(db_dataset)
+    invalidate_dataset(dataset_id)
     return db_dataset
 
 
@@ -93,124 +166,125 @@ async def delete_dataset(dataset_id: int, db: Session = Depends(get_db)):
 
     db.delete(db_dataset)
     db.commit()
+    invalidate_dataset(dataset_id)
     return {"message": "Dataset deleted successfully"}
 
 
-import random
+NDJSON_FORMAT = "ndjson"
+DATA_FORMATS = [RECORDS_FORMAT, COLUMNAR_FORMAT, MSGPACK_FORMAT, ARROW_FORMAT, NDJSON_FORMAT]
+
+
+def _format_response(result: QueryResult, fmt: str) -> Any:
+    headers = {"Vary": "Accept"}
+    if fmt == COLUMNAR_FORMAT:
+        return FastJSONResponse(
+            result.columnar(), media_type=COLUMNAR_JSON_MEDIA_TYPE, headers=headers
+        )
+    if fmt == MSGPACK_FORMAT:
+        return Response(result.to_msgpack(), media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+    if fmt == ARROW_FORMAT:
+        return Response(result.to_arrow(), media_type=ARROW_MEDIA_TYPE, headers=headers)
+    return FastJSONResponse(result.records(), headers=headers)
 
 
 @router.get("/{dataset_id}/data")
 async def get_dataset_data(
-    dataset_id: int, region: Optional[str] = None, db: Session = Depends(get_db)
+    dataset_id: int,
+    request: Request,
+    region: Optional[str] = None,
+    output_format: Optional[str] = Query(None, alias="format"),
+    max_rows: Optional[int] = Query(None, ge=1),
+    max_bytes: Optional[int] = Query(None, ge=1),
+    max_points: Optional[int] = Query(None, ge=MIN_POINTS),
+    widget_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
 ):
+    fmt = negotiate_format(output_format, request.headers.get("accept"))
+    if fmt not in DATA_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    if fmt == ARROW_FORMAT and not arrow_available():
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Arrow output requires pyarrow to be installed",
+        )
+
     dataset = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
     if dataset is None:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    datasource = dataset.datasource
-    query = dataset.query_config.get("query")
+    # 传入 widget_id 时使用该组件 config 中的 transform / max_points，否则使用数据集默认配置
+    transform = None
+    if widget_id is not None:
+        widget = db.query(models.Widget).filter(models.Widget.id == widget_id).first()
+        if widget is None or widget.dataset_id != dataset_id:  # type: ignore
+            raise HTTPException(status_code=404, detail="Widget not found for this dataset")
+        transform = transform_options(widget.config) or None
+        if max_points is None:
+            try:
+                max_points = widget_max_points(widget.config)
+            except DownsampleError as e:
+                raise HTTPException(status_code=400, detail=str(e))
 
-    if str(datasource.type) in ["mysql", "postgresql", "sqlite"] and query:
-        try:
-            # Replace placeholder if region is provided
-            final_query = query
-            if region:
-                final_query = query.replace(":region", f"'{region}'")
+    try:
+        # 查询字符串中与 query_config.params 同名的参数作为绑定变量传入
+        spec = DatasetQuery.from_dataset(dataset, region, request.query_params)
+        validate_transform(transform_options(dataset.query_config) if transform is None else transform)
+    except (QueryParamError, TransformError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-            return execute_query(
-                str(datasource.type),
-                cast(Dict[str, Any], datasource.connection_config),
-                final_query,
+    if fmt == NDJSON_FORMAT:
+        # 大结果集流式输出，不经过结果缓存，也不应用 transform
+        row_limit = min(max_rows or STREAM_MAX_ROWS, STREAM_MAX_ROWS)
+        byte_limit = min(max_bytes or STREAM_MAX_BYTES, STREAM_MAX_BYTES)
+        if spec is not None:
+            try:
+                datasource_limiter(spec.datasource_id, spec.config).check()
+            except DatasourceBusy as e:
+                raise _query_limit_error(e)
+            body = iterate_in_executor(
+                spec.datasource_id,
+                stream_query(
+                    spec.ds_type,
+                    spec.config,
+                    spec.statement,
+                    datasource_id=spec.datasource_id,
+                    max_rows=row_limit,
+                    max_bytes=byte_limit,
+                    params=spec.params,
+                ),
+                spec.config,
             )
+        else:
+            data = mock_dataset_data(dataset, region)
+            rows = data if isinstance(data, list) else [data]
+            body = encode_ndjson(rows, max_rows=row_limit, max_bytes=byte_limit)
+        return StreamingResponse(body, media_type="application/x-ndjson")
+
+    if spec is not None:
+        # 等待查询期间不占用元数据库连接（已加载的属性在关闭后仍可访问）
+        db.close()
+        try:
+            result = await cancel_on_disconnect(
+                request, fetch_downsampled_result(spec, max_points, transform)
+            )
+            return _format_response(result, fmt)
+        except ClientDisconnected:
+            return Response(status_code=499)
+        except (DatasourceBusy, QueryTimeout) as e:
+            raise _query_limit_error(e)
+        except TransformError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             # Fallback to mock if real query fails (maybe for demo purposes)
             print(f"Real query failed, falling back to mock: {e}")
 
-    # Generate mock data based on query_config['type']
-    data_type = dataset.query_config.get("type", "list")
-    mock_data = dataset.query_config.get("mock_data")
-
-    # Simple multiplier based on region for mock linkage
-    multiplier = 1.0
-    if region:
-        # Generate a semi-deterministic multiplier based on region name
-        # Sum ASCII values to make it more variable
-        region_sum = sum(ord(c) for c in region)
-        multiplier = (region_sum % 10 + 5) / 10.0  # Range 0.5 to 1.4
-
-    if mock_data:
-        # Apply multiplier to mock data if region is provided
-        if region:
-            if isinstance(mock_data, list):
-                new_mock = []
-                for item in mock_data:
-                    new_item = item.copy()
-                    if "value" in new_item:
-                        val = new_item["value"]
-                        if isinstance(val, list):
-                            new_item["value"] = [
-                                int(v * multiplier)
-                                if isinstance(v, (int, float))
-                                else v
-                                for v in val
-                            ]
-                        elif isinstance(val, (int, float)):
-                            new_item["value"] = int(val * multiplier)
-                    new_mock.append(new_item)
-                return new_mock
-            elif isinstance(mock_data, dict):
-                new_mock = mock_data.copy()
-                if "value" in new_mock and isinstance(new_mock["value"], (int, float)):
-                    new_mock["value"] = int(new_mock["value"] * multiplier)
-                return new_mock
-        return mock_data
-
-    if data_type == "chart":
-        labels = ["Mon", "Tue", "Wed", "Thu", "Fri"]
-        return [
-            {"label": label, "value": int(random.randint(10, 100) * multiplier)}
-            for label in labels
-        ]
-    elif data_type == "map" or data_type == "echarts_map":
-        # Mock China map data
-        provinces = [
-            "北京",
-            "上海",
-            "广东",
-            "江苏",
-            "浙江",
-            "山东",
-            "河南",
-            "湖北",
-            "四川",
-            "福建",
-        ]
-        return [{"name": p, "value": random.randint(100, 1000)} for p in provinces]
-    elif data_type == "table":
-        return [
-            {
-                "id": 1,
-                "name": f"Event A ({region or 'Global'})",
-                "status": "Active",
-                "time": "10:00",
-            },
-            {
-                "id": 2,
-                "name": f"Event B ({region or 'Global'})",
-                "status": "Pending",
-                "time": "10:05",
-            },
-            {
-                "id": 3,
-                "name": f"Event C ({region or 'Global'})",
-                "status": "Resolved",
-                "time": "10:10",
-            },
-        ]
-    elif data_type == "metric":
-        return {
-            "value": int(random.randint(1000, 9999) * multiplier),
-            "label": region or "总计",
-        }
-
-    return []
+    data = mock_dataset_data(dataset, region)
+    try:
+        result = transform_mock_data(dataset, data, transform)
+    except TransformError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is not None:
+        return _format_response(result, fmt)
+    if fmt == RECORDS_FORMAT:
+        return FastJSONResponse(data)
+    return _format_response(QueryResult.from_data(data), fmt)
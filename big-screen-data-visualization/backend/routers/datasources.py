@@ -2,20 +2,22 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db
+from database import get_db, get_read_db
 import models
 import schemas
-from utils.db_engine import test_connection
+from utils.db_engine import test_connection, dispose_engine
+from utils.dataset_runner import invalidate_dataset
+from utils.json_response import trusted_response
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[schemas.DataSource])
 async def get_datasources(
-    skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)
 ):
     datasources = db.query(models.DataSource).offset(skip).limit(limit).all()
-    return datasources
+    return trusted_response(datasources, schemas.DataSource)
 
 
 @router.post("/test")
@@ -47,7 +49,7 @@ async def create_datasource(
 
 
 @router.get("/{datasource_id}", response_model=schemas.DataSource)
-async def get_datasource(datasource_id: int, db: Session = Depends(get_db)):
+async def get_datasource(datasource_id: int, db: Session = Depends(get_read_db)):
     datasource = (
         db.query(models.DataSource)
         .filter(models.DataSource.id == datasource_id)
@@ -78,6 +80,9 @@ async def update_datasource(
 
     db.commit()
     db.refresh(db_datasource)
+    dispose_engine(datasource_id)
+    for dataset in db_datasource.datasets:
+        invalidate_dataset(dataset.id)  # type: ignore
     return db_datasource
 
 
@@ -91,6 +96,10 @@ async def delete_datasource(datasource_id: int, db: Session = Depends(get_db)):
     if db_datasource is None:
         raise HTTPException(status_code=404, detail="DataSource not found")
 
+    dataset_ids = [dataset.id for dataset in db_datasource.datasets]
     db.delete(db_datasource)
     db.commit()
+    dispose_engine(datasource_id)
+    for dataset_id in dataset_ids:
+        invalidate_dataset(dataset_id)  # type: ignore
     return {"message": "DataSource deleted successfully"}
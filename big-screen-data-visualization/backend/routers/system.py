@@ -1,53 +1,30 @@
-from fastapi import APIRouter, Depends
-import random
-import time
-from sqlalchemy.orm import Session
-from database import SessionLocal
-import models
-import schemas
+from fastapi import APIRouter, Query
+from utils.alarm_coalescer import alarm_coalescer
+from utils.system_sampler import (
+    DEFAULT_HISTORY_POINTS,
+    HISTORY_SIZE,
+    MAX_HISTORY_POINTS,
+    SAMPLE_INTERVAL,
+    system_sampler,
+)
 
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@router.get("/stats")
+async def get_system_stats():
+    # 只读取后台采样的最新快照，不访问主机或数据库
+    return system_sampler.latest()
 
 
-@router.get("/stats")
-async def get_system_stats(db: Session = Depends(get_db)):
-    # Simulate real-time data
-    cpu_usage = round(random.uniform(20.0, 95.0), 1)
-    mem_usage = round(random.uniform(30.0, 90.0), 1)
+@router.get("/stats/history")
+async def get_system_stats_history(
+    window: float = Query(600, gt=0, le=HISTORY_SIZE * SAMPLE_INTERVAL),
+    points: int = Query(DEFAULT_HISTORY_POINTS, ge=1, le=MAX_HISTORY_POINTS),
+):
+    return system_sampler.history(window, points)
 
-    # Trigger alarm if CPU > 90%
-    if cpu_usage > 90.0:
-        alarm = models.Alarm(
-            level="critical",
-            message=f"CPU usage critically high: {cpu_usage}%",
-            source="system_monitor",
-        )
-        db.add(alarm)
-        db.commit()
-    elif cpu_usage > 80.0:
-        alarm = models.Alarm(
-            level="warning",
-            message=f"CPU usage high: {cpu_usage}%",
-            source="system_monitor",
-        )
-        db.add(alarm)
-        db.commit()
 
-    return {
-        "cpu": {"usage": cpu_usage, "cores": 8, "load_average": [1.5, 1.2, 1.1]},
-        "memory": {
-            "total": 16384,
-            "used": round(16384 * mem_usage / 100, 0),
-            "usage_percent": mem_usage,
-        },
-        "disk": {"total": 512000, "used": 320000, "usage_percent": 62.5},
-        "timestamp": int(time.time()),
-    }
+@router.get("/alarm-suppression")
+async def get_alarm_suppression():
+    return alarm_coalescer.stats()
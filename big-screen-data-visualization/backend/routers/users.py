@@ -8,13 +8,16 @@ import models
 import schemas
 from utils.auth import (
     get_db,
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
     create_access_token,
     get_current_active_user,
     get_current_admin_user,
+    token_claims,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
+from utils.login_limiter import login_limiter
+from utils.user_cache import UserSnapshot, user_cache
 
 router = APIRouter()
 
@@ -23,38 +26,66 @@ router = APIRouter()
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
 ):
-    user = (
-        db.query(models.User).filter(models.User.username == form_data.username).first()
-    )
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    stamp, retry_after = login_limiter.reserve(form_data.username)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(retry_after)},
+        )
+    try:
+        user = (
+            db.query(models.User).filter(models.User.username == form_data.username).first()
+        )
+        hashed_password = user.hashed_password if user else None
+        claims = token_claims(user) if user else None
+        # bcrypt 校验期间不占用数据库连接
+        db.close()
+        verified = bool(hashed_password) and await verify_password_async(
+            form_data.password, hashed_password
+        )
+    except BaseException:
+        login_limiter.release(form_data.username, stamp)
+        raise
+    if not verified:
+        # 预记的失败保留，计入限制
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_limiter.reset(form_data.username)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    access_token = create_access_token(data=claims, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(get_current_active_user)):
+async def read_users_me(current_user: UserSnapshot = Depends(get_current_active_user)):
     return current_user
 
 
 @router.post("/change-password")
 async def change_password(
     pwd_data: schemas.UserPasswordChange,
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: UserSnapshot = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
-    if not verify_password(pwd_data.old_password, current_user.hashed_password):
+    db_user = db.query(models.User).filter(models.User.id == current_user.id).first()
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    hashed_password = db_user.hashed_password
+    # 结束读事务，bcrypt 计算期间不占用数据库连接
+    db.rollback()
+    if not await verify_password_async(pwd_data.old_password, hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect old password")
+    new_hash = await get_password_hash_async(pwd_data.new_password)
 
-    current_user.hashed_password = get_password_hash(pwd_data.new_password)  # type: ignore
+    db_user.hashed_password = new_hash  # type: ignore
+    # 吊销此前签发的所有令牌
+    db_user.token_version = models.User.token_version + 1  # type: ignore
     db.commit()
+    user_cache.invalidate(current_user.username)  # type: ignore
     return {"message": "Password updated successfully"}
 
 
@@ -64,7 +95,7 @@ async def read_users(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user),
+    current_user: UserSnapshot = Depends(get_current_admin_user),
 ):
     users = db.query(models.User).offset(skip).limit(limit).all()
     return users
@@ -74,19 +105,21 @@ async def read_users(
 async def create_user(
     user_in: schemas.UserCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user),
+    current_user: UserSnapshot = Depends(get_current_admin_user),
 ):
     db_user = (
         db.query(models.User).filter(models.User.username == user_in.username).first()
     )
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
+    db.rollback()
+    hashed_password = await get_password_hash_async(user_in.password)
 
     db_user = models.User(
         username=user_in.username,
         email=user_in.email,
         full_name=user_in.full_name,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=hashed_password,
         is_active=user_in.is_active,
         is_admin=user_in.is_admin,
     )
@@ -101,7 +134,7 @@ async def update_user(
     user_id: int,
     user_in: schemas.UserUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user),
+    current_user: UserSnapshot = Depends(get_current_admin_user),
 ):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if not db_user:
@@ -112,6 +145,7 @@ async def update_user(
         setattr(db_user, field, value)
 
     db.commit()
+    user_cache.invalidate(db_user.username)  # type: ignore
     db.refresh(db_user)
     return db_user
 
@@ -120,7 +154,7 @@ async def update_user(
 async def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user),
+    current_user: UserSnapshot = Depends(get_current_admin_user),
 ):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if not db_user:
@@ -131,4 +165,5 @@ async def delete_user(
 
     db.delete(db_user)
     db.commit()
+    user_cache.invalidate(db_user.username)  # type: ignore
     return {"message": "User deleted successfully"}
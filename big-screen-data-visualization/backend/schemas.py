@@ -157,6 +157,13 @@ class Dashboard(DashboardBase):
         from_attributes = True
 
 
+class DashboardRender(BaseModel):
+    dashboard: Dashboard
+    data: Dict[int, Any] = {}  # dataset_id -> data
+    widget_data: Dict[int, Any] = {}  # widget_id -> transformed data
+    errors: Dict[int, str] = {}  # widget_id -> error message
+
+
 class AlarmBase(BaseModel):
     level: str
     message: str
@@ -171,6 +178,8 @@ class AlarmCreate(AlarmBase):
 class Alarm(AlarmBase):
     id: int
     created_at: datetime
+    occurrences: int = 1
+    last_seen: Optional[datetime] = None
 
     class Config:
         from_attributes = True
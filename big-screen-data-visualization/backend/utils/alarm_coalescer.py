@@ -0,0 +1,254 @@
+import asyncio
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from database import SessionLocal
+from utils.alarm_counters import adjust_unread
+from utils.pubsub import ALARMS_TOPIC, broker
+
+# 同一 (来源, 级别, 消息模板) 距上次出现不超过窗口时合并为一条告警
+COALESCE_WINDOW = 300  # seconds
+# 合并期间累计的次数最多每隔 COALESCE_FLUSH_INTERVAL 秒写回一次
+COALESCE_FLUSH_INTERVAL = 10  # seconds
+# 每个来源每个周期最多新建的告警条数，超出的告警被抑制（只计数）
+SOURCE_RATE_LIMIT = 10
+SOURCE_RATE_PERIOD = 60  # seconds
+
+_EPOCH = datetime(1970, 1, 1)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+CoalesceKey = Tuple[Optional[str], str, str]
+
+
+def message_template(message: str) -> str:
+    # "CPU usage high: 85.3%" -> "CPU usage high: #%"
+    return _NUMBER_RE.sub("#", message)
+
+
+class _OpenAlarm:
+    __slots__ = ("alarm_id", "message", "last_seen", "pending", "flushed_at")
+
+    def __init__(self, alarm_id: int, message: str, last_seen: float, now: float):
+        self.alarm_id = alarm_id
+        self.message = message
+        self.last_seen = last_seen
+        self.pending = 0
+        self.flushed_at = now
+
+
+class _SourceBudget:
+    __slots__ = ("period_start", "created", "suppressed")
+
+    def __init__(self, now: float):
+        self.period_start = now
+        self.created = 0
+        self.suppressed = 0
+
+
+class AlarmCoalescer:
+    def __init__(
+        self,
+        window: float = COALESCE_WINDOW,
+        flush_interval: float = COALESCE_FLUSH_INTERVAL,
+        rate_limit: int = SOURCE_RATE_LIMIT,
+        rate_period: float = SOURCE_RATE_PERIOD,
+    ):
+        self.window = window
+        self.flush_interval = flush_interval
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self._open: Dict[CoalesceKey, _OpenAlarm] = {}
+        self._budgets: Dict[Optional[str], _SourceBudget] = {}
+        self._lock = threading.Lock()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.created = 0
+        self.coalesced = 0
+        self.suppressed = 0
+
+    def record(
+        self, db: Session, level: str, message: str, source: Optional[str]
+    ) -> Optional[models.Alarm]:
+        # 返回新建的告警；被合并或被限流时返回 None
+        now = time.time()
+        key = (source, level, message_template(message))
+        with self._lock:
+            self._flush_due(db, now)
+            entry = self._open.get(key)
+            if entry is None:
+                entry = self._load_open(db, key, now)
+            if entry is not None:
+                entry.pending += 1
+                entry.last_seen = now
+                entry.message = message
+                self.coalesced += 1
+                if now - entry.flushed_at >= self.flush_interval:
+                    self._flush_entry(db, key, entry)
+                db.commit()
+                return None
+
+            if not self._allow(source, now):
+                db.commit()
+                return None
+            alarm = self._insert(db, level, message, source, 1)
+            self._open[key] = _OpenAlarm(alarm.id, message, now, now)  # type: ignore
+            self.created += 1
+            db.commit()
+        db.refresh(alarm)
+        broker.publish(ALARMS_TOPIC, "alarm", schemas.Alarm.model_validate(alarm))
+        return alarm
+
+    def _flush_due(self, db: Session, now: float) -> None:
+        # 写回到期的累计次数，并关闭超出窗口的合并项
+        for key, entry in list(self._open.items()):
+            expired = now - entry.last_seen >= self.window
+            due = expired or now - entry.flushed_at >= self.flush_interval
+            if entry.pending and due:
+                self._flush_entry(db, key, entry)
+            if expired:
+                del self._open[key]
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self) -> None:
+        # 告警风暴结束后不再有新的 record() 调用，定期写回剩余的累计次数与 last_seen
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                with SessionLocal() as db:
+                    self.flush_due(db)
+            except Exception as e:
+                print(f"Alarm coalescer flush failed: {e}")
+
+    def flush_due(self, db: Session) -> None:
+        with self._lock:
+            self._flush_due(db, time.time())
+            db.commit()
+
+    def flush(self, db: Session) -> None:
+        with self._lock:
+            for key, entry in list(self._open.items()):
+                self._flush_entry(db, key, entry)
+            db.commit()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "created": self.created,
+                "coalesced": self.coalesced,
+                "suppressed": self.suppressed,
+                "suppressed_by_source": {
+                    source: budget.suppressed
+                    for source, budget in self._budgets.items()
+                    if budget.suppressed
+                },
+            }
+
+    def _allow(self, source: Optional[str], now: float) -> bool:
+        budget = self._budgets.get(source)
+        if budget is None or now - budget.period_start >= self.rate_period:
+            suppressed = budget.suppressed if budget is not None else 0
+            budget = self._budgets[source] = _SourceBudget(now)
+            budget.suppressed = suppressed
+        if budget.created >= self.rate_limit:
+            budget.suppressed += 1
+            self.suppressed += 1
+            return False
+        budget.created += 1
+        return True
+
+    def _load_open(
+        self, db: Session, key: CoalesceKey, now: float
+    ) -> Optional[_OpenAlarm]:
+        # 进程重启后从数据库找回窗口内仍未读的同类告警
+        source, level, template = key
+        since = datetime.utcfromtimestamp(now - self.window)
+        candidates = (
+            db.query(models.Alarm)
+            .filter(
+                models.Alarm.source == source,
+                models.Alarm.level == level,
+                models.Alarm.is_read.is_(False),
+                models.Alarm.last_seen >= since,
+            )
+            .order_by(models.Alarm.last_seen.desc())
+            .limit(20)
+            .all()
+        )
+        for alarm in candidates:
+            if message_template(alarm.message) == template:  # type: ignore
+                last_seen = (alarm.last_seen - _EPOCH) / timedelta(seconds=1)  # type: ignore
+                entry = _OpenAlarm(alarm.id, alarm.message, last_seen, now)  # type: ignore
+                self._open[key] = entry
+                return entry
+        return None
+
+    def _flush_entry(self, db: Session, key: CoalesceKey, entry: _OpenAlarm) -> None:
+        if not entry.pending:
+            return
+        pending, entry.pending = entry.pending, 0
+        entry.flushed_at = time.time()
+        last_seen = datetime.utcfromtimestamp(entry.last_seen)
+        updated = (
+            db.query(models.Alarm)
+            .filter(models.Alarm.id == entry.alarm_id, models.Alarm.is_read.is_(False))
+            .update(
+                {
+                    models.Alarm.occurrences: models.Alarm.occurrences + pending,
+                    models.Alarm.last_seen: last_seen,
+                },
+                synchronize_session=False,
+            )
+        )
+        if updated:
+            broker.publish(
+                ALARMS_TOPIC,
+                "alarm_update",
+                {"id": entry.alarm_id, "added": pending, "last_seen": last_seen},
+            )
+            return
+        # 告警已被标记已读或删除：剩余次数另起一条新告警
+        source, level, _ = key
+        alarm = self._insert(db, level, entry.message, source, pending)
+        entry.alarm_id = alarm.id  # type: ignore
+
+    def _insert(
+        self,
+        db: Session,
+        level: str,
+        message: str,
+        source: Optional[str],
+        occurrences: int,
+    ) -> models.Alarm:
+        now = datetime.utcnow()
+        alarm = models.Alarm(
+            level=level,
+            message=message,
+            source=source,
+            occurrences=occurrences,
+            created_at=now,
+            last_seen=now,
+        )
+        db.add(alarm)
+        adjust_unread(db, level, 1)
+        db.flush()
+        return alarm
+
+
+alarm_coalescer = AlarmCoalescer()
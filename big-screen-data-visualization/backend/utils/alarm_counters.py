@@ -0,0 +1,48 @@
+from typing import Dict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+
+# 未读告警数按级别维护在 alarm_counters 表中，与告警写入处于同一事务
+ALARM_LEVELS = ["critical", "warning", "info"]
+
+
+def adjust_unread(db: Session, level: str, delta: int) -> None:
+    updated = (
+        db.query(models.AlarmCounter)
+        .filter(models.AlarmCounter.level == level)
+        .update(
+            {models.AlarmCounter.unread: models.AlarmCounter.unread + delta},
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        db.add(models.AlarmCounter(level=level, unread=max(delta, 0)))
+
+
+def rebuild(db: Session) -> None:
+    counts = dict(
+        db.query(models.Alarm.level, func.count(models.Alarm.id))
+        .filter(models.Alarm.is_read.is_(False))
+        .group_by(models.Alarm.level)
+        .all()
+    )
+    db.query(models.AlarmCounter).delete(synchronize_session=False)
+    for level in set(ALARM_LEVELS) | set(counts):
+        db.add(models.AlarmCounter(level=level, unread=counts.get(level, 0)))
+    db.commit()
+
+
+def ensure_initialized(db: Session) -> None:
+    # 计数表为空（新建或被清理过）时从告警表回填一次
+    if db.query(models.AlarmCounter).first() is None:
+        rebuild(db)
+
+
+def unread_summary(db: Session) -> Dict[str, int]:
+    return {
+        row.level: max(row.unread, 0)  # type: ignore
+        for row in db.query(models.AlarmCounter).all()
+    }
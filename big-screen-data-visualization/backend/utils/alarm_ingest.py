@@ -0,0 +1,136 @@
+import asyncio
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import models
+from database import SessionLocal
+from utils.alarm_counters import adjust_unread
+from utils.pubsub import ALARMS_TOPIC, broker
+
+MAX_BATCH_SIZE = 1000  # alarms per POST /api/alarms/batch
+# 单条告警写后缓冲：每 FLUSH_INTERVAL 秒或累计 FLUSH_MAX_ROWS 条落库一次
+FLUSH_INTERVAL = 0.2
+FLUSH_MAX_ROWS = 500
+# 缓冲上限，满时拒绝新告警（503 + Retry-After），不静默丢弃
+MAX_PENDING_ALARMS = 10000
+QUEUE_FULL_RETRY_AFTER = 1  # seconds
+
+
+def insert_alarms(db: Session, alarms: List[Dict[str, Any]]) -> int:
+    # 单个事务、单条 executemany INSERT，并同步更新未读计数
+    if not alarms:
+        return 0
+    now = datetime.utcnow()
+    rows = []
+    for a in alarms:
+        created_at = a.get("created_at") or now
+        rows.append(
+            {
+                "level": a["level"],
+                "message": a["message"],
+                "source": a.get("source"),
+                "is_read": bool(a.get("is_read", False)),
+                "created_at": created_at,
+                "occurrences": 1,
+                "last_seen": created_at,
+            }
+        )
+    db.execute(insert(models.Alarm), rows)
+    for level, count in Counter(r["level"] for r in rows if not r["is_read"]).items():
+        adjust_unread(db, level, count)
+    db.commit()
+    return len(rows)
+
+
+def publish_batch(alarms: List[Dict[str, Any]]) -> None:
+    # 批量告警只推送汇总事件，大屏收到后按需重新拉取
+    levels = Counter(a["level"] for a in alarms)
+    broker.publish(
+        ALARMS_TOPIC, "alarm_batch", {"count": len(alarms), "levels": dict(levels)}
+    )
+
+
+def _insert_with_session(alarms: List[Dict[str, Any]]) -> int:
+    db = SessionLocal()
+    try:
+        return insert_alarms(db, alarms)
+    finally:
+        db.close()
+
+
+class AlarmQueueFull(Exception):
+    pass
+
+
+class AlarmWriteQueue:
+    def __init__(self):
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, alarm: Dict[str, Any]) -> None:
+        if len(self._pending) >= MAX_PENDING_ALARMS:
+            raise AlarmQueueFull()
+        alarm.setdefault("created_at", datetime.utcnow())
+        self._pending.append(alarm)
+        if len(self._pending) >= FLUSH_MAX_ROWS and self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # 退出前把剩余告警写入数据库
+        while self._pending:
+            if not await self.flush():
+                break
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), FLUSH_INTERVAL)  # type: ignore
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()  # type: ignore
+            while self._pending:
+                if not await self.flush():
+                    break
+
+    async def flush(self) -> bool:
+        batch = [
+            self._pending.popleft()
+            for _ in range(min(FLUSH_MAX_ROWS, len(self._pending)))
+        ]
+        if not batch:
+            return True
+        try:
+            await run_in_threadpool(_insert_with_session, batch)
+        except Exception as e:
+            # 写入失败（如数据库被锁）：放回队首，下个周期重试
+            print(f"Alarm flush failed, will retry: {e}")
+            self._pending.extendleft(reversed(batch))
+            self.failed_flushes += 1
+            return False
+        self.flushed += len(batch)
+        publish_batch(batch)
+        return True
+
+
+alarm_queue = AlarmWriteQueue()
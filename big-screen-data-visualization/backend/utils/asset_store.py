@@ -0,0 +1,72 @@
+import hashlib
+import mimetypes
+import os
+import uuid
+from typing import Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+
+UPLOAD_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads"
+)
+# 上传过程中的临时文件放在不对外提供访问的目录（与 UPLOAD_DIR 同一文件系统，可原子重命名）
+UPLOAD_TMP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "upload_tmp"
+)
+# 上传文件按内容 SHA-256 命名：同一张背景图在多个大屏中重复上传时只保存一份
+ASSET_MAX_BYTES = 20 * 1024 * 1024
+ASSET_CHUNK_SIZE = 1024 * 1024
+ASSET_URL_PREFIX = "http://localhost:8000/uploads/"
+# multipart 边界与字段头的余量，用于限制整个请求体
+ASSET_MULTIPART_OVERHEAD = 64 * 1024
+
+
+class AssetTooLarge(Exception):
+    pass
+
+
+def asset_extension(content_type: Optional[str], filename: Optional[str]) -> str:
+    # 扩展名优先由 content_type 决定，避免同一内容因文件名不同而存成两份
+    ext = mimetypes.guess_extension(content_type or "") or ""
+    if not ext and filename:
+        ext = os.path.splitext(filename)[1]
+    return ext.lower()
+
+
+def asset_url(name: str) -> str:
+    return f"{ASSET_URL_PREFIX}{name}"
+
+
+async def store_upload(
+    file: UploadFile, max_bytes: int = ASSET_MAX_BYTES
+) -> Tuple[str, bool]:
+    # 分块异步写入临时文件并同时计算哈希，返回 (文件名, 是否为新文件)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    tmp_path = os.path.join(UPLOAD_TMP_DIR, f"upload-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while True:
+                chunk = await file.read(ASSET_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AssetTooLarge()
+                digest.update(chunk)
+                await out.write(chunk)
+
+        name = digest.hexdigest() + asset_extension(file.content_type, file.filename)
+        path = os.path.join(UPLOAD_DIR, name)
+        if await aiofiles.os.path.exists(path):
+            return name, False
+        # 原子重命名：并发上传同一内容时最终只留下一份完整文件
+        await aiofiles.os.replace(tmp_path, path)
+        return name, True
+    finally:
+        if await aiofiles.os.path.exists(tmp_path):
+            await aiofiles.os.remove(tmp_path)
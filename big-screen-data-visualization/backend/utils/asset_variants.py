@@ -0,0 +1,279 @@
+import gzip
+import io
+import mimetypes
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import anyio
+import brotli
+from PIL import Image, ImageOps
+from starlette.datastructures import Headers, QueryParams
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, PlainTextResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from utils.asset_store import UPLOAD_DIR
+
+# 大屏背景图多为数 MB 的 PNG：上传时生成常用宽度的 WebP 缩放图，按 ?w= 取用；
+# 缩放图放在独立的磁盘缓存中，超过容量按最近使用淘汰，被淘汰的变体在请求时重新生成
+VARIANT_DIR = os.path.join(os.path.dirname(UPLOAD_DIR), "asset_cache")
+VARIANT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+VARIANT_WIDTHS = (320, 640, 960, 1280, 1920, 2560, 3840)
+WEBP_QUALITY = 80
+RESIZABLE_EXTENSIONS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP", ".bmp": "BMP"}
+# SVG/JSON 上传时预压缩，按 Accept-Encoding 直接返回压缩副本
+COMPRESSIBLE_EXTENSIONS = {".svg", ".json"}
+SIDECAR_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 按内容哈希命名的文件内容不会变化，可以长期缓存
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]+)?$")
+
+
+class VariantCache:
+    def __init__(self, directory: str = VARIANT_DIR, max_bytes: int = VARIANT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        # 启动后首次访问时扫描目录，按修改时间恢复近似的使用顺序
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                st = entry.stat()
+                files.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+        self._loaded = True
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = self.path(name)
+        return path if os.path.exists(path) else None
+
+    def put(self, name: str, data: bytes) -> str:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        path = self.path(name)
+        tmp_path = self.path(f".{name}.{uuid.uuid4().hex}")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        evicted = []
+        with self._lock:
+            self._total += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(self.path(old_name))
+            except FileNotFoundError:
+                pass
+        return path
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+variant_cache = VariantCache()
+
+
+def _snap_width(width: int) -> int:
+    # 任意 ?w= 向上取整到预设宽度，限制缓存中变体的数量
+    for preset in VARIANT_WIDTHS:
+        if width <= preset:
+            return preset
+    return VARIANT_WIDTHS[-1]
+
+
+@lru_cache(maxsize=1024)
+def _image_size(name: str) -> Tuple[int, int]:
+    # 文件按内容哈希命名，尺寸不会变化
+    with Image.open(os.path.join(UPLOAD_DIR, name)) as image:
+        width, height = image.size
+        # EXIF 方向为 5-8 时图片需要旋转 90 度，宽高互换
+        if image.getexif().get(0x0112) in (5, 6, 7, 8):
+            return height, width
+        return width, height
+
+
+def _variant_name(name: str, width: int, webp: bool) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-w{width}{'.webp' if webp else ext}"
+
+
+def _encode_variant(image: Image.Image, width: int, ext: str, webp: bool) -> bytes:
+    if width < image.width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    if webp:
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    else:
+        fmt = RESIZABLE_EXTENSIONS[ext]
+        if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffer, fmt, **({"quality": 85, "optimize": True} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def _open_original(name: str) -> Image.Image:
+    image = Image.open(os.path.join(UPLOAD_DIR, name))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image
+
+
+def _target_width(name: str, width: Optional[int], webp: bool) -> Optional[int]:
+    # 返回需要的变体宽度；None 表示直接返回原图
+    ext = os.path.splitext(name)[1]
+    if ext not in RESIZABLE_EXTENSIONS:
+        return None
+    original_width = _image_size(name)[0]
+    target = _snap_width(width) if width else original_width
+    if target >= original_width:
+        if not webp or ext == ".webp":
+            return None
+        target = original_width
+    return target
+
+
+def variant_path(name: str, width: Optional[int], webp: bool) -> Optional[str]:
+    target = _target_width(name, width, webp)
+    if target is None:
+        return None
+    ext = os.path.splitext(name)[1]
+    variant = _variant_name(name, target, webp and ext != ".webp")
+    path = variant_cache.get(variant)
+    if path is None:
+        with _open_original(name) as image:
+            data = _encode_variant(image, target, ext, webp and ext != ".webp")
+        path = variant_cache.put(variant, data)
+    return path
+
+
+def generate_variants(name: str) -> None:
+    # 上传时预生成：各预设宽度的 WebP 缩放图与原尺寸 WebP，SVG/JSON 生成 br/gzip 压缩副本
+    ext = os.path.splitext(name)[1]
+    if ext in COMPRESSIBLE_EXTENSIONS:
+        _write_sidecars(name)
+        return
+    if ext not in RESIZABLE_EXTENSIONS:
+        return
+    with _open_original(name) as image:
+        widths = [w for w in VARIANT_WIDTHS if w < image.width]
+        if ext != ".webp":
+            widths.append(image.width)
+        for width in widths:
+            variant_cache.put(
+                _variant_name(name, width, True), _encode_variant(image, width, ext, True)
+            )
+
+
+def _write_sidecars(name: str) -> None:
+    path = os.path.join(UPLOAD_DIR, name)
+    with open(path, "rb") as f:
+        data = f.read()
+    for encoding, suffix in SIDECAR_ENCODINGS:
+        if encoding == "br":
+            compressed = brotli.compress(data, quality=11)
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        # 压缩后没有变小（如内容过短）时不生成副本
+        if len(compressed) < len(data):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+
+
+def _sidecar(name: str, accept_encoding: str) -> Optional[Tuple[str, str]]:
+    accepted = {token.split(";")[0].strip() for token in accept_encoding.lower().split(",")}
+    for encoding, suffix in SIDECAR_ENCODINGS:
+        path = os.path.join(UPLOAD_DIR, name + suffix)
+        if encoding in accepted and os.path.exists(path):
+            return encoding, path
+    return None
+
+
+class AssetStaticFiles(StaticFiles):
+    # 替代普通 StaticFiles：按内容哈希命名的上传文件返回 immutable 缓存头与强 ETag，
+    # 支持 ?w= 缩放/WebP 变体与预压缩副本；其他文件（旧的 UUID 文件名）保持原有行为
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD") or not CONTENT_ADDRESSED_NAME.match(path):
+            return await super().get_response(path, scope)
+
+        original = os.path.join(UPLOAD_DIR, path)
+        if not os.path.isfile(original):
+            raise HTTPException(status_code=404)
+
+        request_headers = Headers(scope=scope)
+        query = QueryParams(scope["query_string"])
+        width = None
+        if query.get("w"):
+            if not query["w"].isdigit() or int(query["w"]) <= 0:
+                return PlainTextResponse("w must be a positive integer", status_code=400)
+            width = int(query["w"])
+
+        stem, ext = os.path.splitext(path)
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        headers = {"cache-control": IMMUTABLE_CACHE_CONTROL}
+        full_path = original
+        tag = stem
+
+        if ext in RESIZABLE_EXTENSIONS:
+            headers["vary"] = "Accept"
+            webp = "image/webp" in request_headers.get("accept", "")
+            try:
+                variant = await anyio.to_thread.run_sync(variant_path, path, width, webp)
+            except (OSError, Image.DecompressionBombError):
+                # 无法解码的图片直接返回原文件
+                variant = None
+            if variant is not None:
+                full_path = variant
+                tag = os.path.basename(variant)
+                if variant.endswith(".webp"):
+                    media_type = "image/webp"
+        elif ext in COMPRESSIBLE_EXTENSIONS:
+            headers["vary"] = "Accept-Encoding"
+            sidecar = _sidecar(path, request_headers.get("accept-encoding", ""))
+            if sidecar is not None:
+                encoding, full_path = sidecar
+                headers["content-encoding"] = encoding
+                tag = os.path.basename(full_path)
+
+        headers["etag"] = f'"{tag}"'
+        response = FileResponse(
+            full_path,
+            media_type=media_type,
+            headers=headers,
+            method=scope["method"],
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
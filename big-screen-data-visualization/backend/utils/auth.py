@@ -4,9 +4,14 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 import models
-from database import SessionLocal
+from database import ReadSessionLocal, SessionLocal
+from utils.password_hashing import (
+    PASSWORD_POOL_RETRY_AFTER,
+    PasswordPoolBusy,
+    run_password_task,
+)
+from utils.user_cache import UserSnapshot, user_cache
 
 # 建议在实际生产中使用环境变量
 SECRET_KEY = "a-very-secret-key-for-situational-dashboard"
@@ -25,6 +30,26 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+async def _run_password_task(fn, *args):
+    try:
+        return await run_password_task(fn, *args)
+    except PasswordPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent password operations",
+            headers={"Retry-After": str(PASSWORD_POOL_RETRY_AFTER)},
+        )
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    # 请求处理路径使用异步版本，bcrypt 在专用线程池中执行
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password) -> str:
+    return await _run_password_task(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -44,9 +69,24 @@ def get_db():
         db.close()
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
+def token_claims(user: models.User) -> dict:
+    # ver 与 users.token_version 比对：修改密码后旧令牌立即失效
+    return {"sub": user.username, "ver": user.token_version or 0}
+
+
+def load_user(username: str) -> Optional[UserSnapshot]:
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+    generation = user_cache.generation(username)
+    with ReadSessionLocal() as db:
+        db_user = db.query(models.User).filter(models.User.username == username).first()
+        if db_user is None:
+            return None
+        return user_cache.set(db_user, generation)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -60,14 +100,14 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+    user = load_user(username)
+    if user is None or payload.get("ver", 0) != user.token_version:
         raise credentials_exception
     return user
 
 
 async def get_current_active_user(
-    current_user: models.User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
 ):
     if current_user.is_active is False:  # type: ignore
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -75,7 +115,7 @@ async def get_current_active_user(
 
 
 async def get_current_admin_user(
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: UserSnapshot = Depends(get_current_active_user),
 ):
     if current_user.is_admin is False:  # type: ignore
         raise HTTPException(
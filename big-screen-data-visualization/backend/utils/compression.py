@@ -0,0 +1,176 @@
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+import anyio
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from backports import zstd
+except ImportError:  # zstd 为可选依赖，未安装时只协商 br/gzip
+    zstd = None
+
+# 响应压缩：按 Accept-Encoding 协商 zstd/br/gzip。压缩级别按延迟取值（而非最高压缩率），
+# 小于阈值的响应不压缩；大响应体在线程中压缩，不阻塞事件循环
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_IN_THREAD_SIZE = 256 * 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+# 已压缩的格式与需要逐条推送的 SSE 不再压缩
+_EXCLUDED_CONTENT_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "text/event-stream",
+)
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._zstd = zstd.ZstdCompressor(level=ZSTD_LEVEL)  # type: ignore
+        elif encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        # 每个分块都刷新输出，流式响应的客户端可以立即解压已收到的数据
+        if self.encoding == "zstd":
+            return self._zstd.compress(data, mode=zstd.ZstdCompressor.FLUSH_BLOCK)  # type: ignore
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "zstd":
+            out = self._zstd.compress(data) if data else b""
+            return out + self._zstd.flush(mode=zstd.ZstdCompressor.FLUSH_FRAME)  # type: ignore
+        if self.encoding == "br":
+            return (self._br.process(data) if data else b"") + self._br.finish()
+        return self._gzip.compress(data) + self._gzip.flush()
+
+
+def available_encodings() -> List[str]:
+    # 同等 q 值时的优先顺序
+    return (["zstd"] if zstd is not None else []) + ["br", "gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    if not accept_encoding:
+        return None
+    weights = {}
+    for token in accept_encoding.lower().split(","):
+        name, _, params = token.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    best: Optional[Tuple[float, int, str]] = None
+    for rank, encoding in enumerate(available_encodings()):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > 0 and (best is None or (q, -rank) > best[:2]):
+            best = (q, -rank, encoding)
+    return best[2] if best else None
+
+
+def compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    content_type = headers.get("content-type", "").lower()
+    return not content_type.startswith(_EXCLUDED_CONTENT_TYPES)
+
+
+async def _run(fn: Callable[[bytes], bytes], data: bytes) -> bytes:
+    if len(data) >= COMPRESS_IN_THREAD_SIZE:
+        return await anyio.to_thread.run_sync(fn, data)
+    return fn(data)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send
+        self.initial_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.started = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    async def send_with_compression(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # 等到第一个响应体分块时再决定是否压缩
+            self.initial_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not self.started:
+            self.started = True
+            assert self.initial_message is not None
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            if not compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # 压缩后字节不同，强 ETag 降为弱 ETag（If-None-Match 比较时忽略 W/ 前缀）
+                headers["ETag"] = "W/" + etag
+            if more_body:
+                del headers["Content-Length"]
+                body = await _run(self.compressor.chunk, body)
+            else:
+                body = await _run(self.compressor.finish, body)
+                headers["Content-Length"] = str(len(body))
+            await self.send(self.initial_message)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if self.compressor is None:
+            await self.send(message)
+            return
+        if more_body:
+            body = await _run(self.compressor.chunk, body)
+        else:
+            body = await _run(self.compressor.finish, body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
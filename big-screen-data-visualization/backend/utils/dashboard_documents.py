@@ -0,0 +1,89 @@
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from fastapi.responses import Response
+from sqlalchemy.orm import Session, selectinload
+
+import models
+import schemas
+from utils.json_response import dump_json, trusted_dict
+
+# 大屏定义（布局 + 组件）很少变化：序列化一次，按内容哈希生成 ETag
+DOCUMENT_CACHE_CONTROL = "no-cache"  # 每次都需校验，但校验命中时只返回 304
+
+
+class DashboardDocument:
+    __slots__ = ("dashboard_body", "dashboard_etag", "widgets_body", "widgets_etag")
+
+    def __init__(self, dashboard: Dict[str, Any]):
+        self.dashboard_body = _encode(dashboard)
+        self.dashboard_etag = _etag(self.dashboard_body)
+        self.widgets_body = _encode(dashboard.get("widgets", []))
+        self.widgets_etag = _etag(self.widgets_body)
+
+
+def _encode(value: Any) -> bytes:
+    return dump_json(value)
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+_documents: Dict[int, DashboardDocument] = {}
+_versions: Dict[int, int] = {}
+_lock = threading.Lock()
+
+
+def invalidate_dashboard(dashboard_id: Optional[int]) -> None:
+    if dashboard_id is None:
+        return
+    with _lock:
+        _documents.pop(dashboard_id, None)
+        _versions[dashboard_id] = _versions.get(dashboard_id, 0) + 1
+
+
+def get_dashboard_document(db: Session, dashboard_id: int) -> Optional[DashboardDocument]:
+    with _lock:
+        doc = _documents.get(dashboard_id)
+        version = _versions.get(dashboard_id, 0)
+    if doc is not None:
+        return doc
+
+    dashboard = (
+        db.query(models.Dashboard)
+        .options(selectinload(models.Dashboard.widgets))
+        .filter(models.Dashboard.id == dashboard_id)
+        .first()
+    )
+    if dashboard is None:
+        return None
+    doc = DashboardDocument(trusted_dict(dashboard, schemas.Dashboard))
+
+    with _lock:
+        # 构建期间发生写操作则不缓存，避免保存过期文档
+        if _versions.get(dashboard_id, 0) == version:
+            _documents[dashboard_id] = doc
+    return doc
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def document_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": etag, "Cache-Control": DOCUMENT_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
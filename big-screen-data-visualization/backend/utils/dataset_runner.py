@@ -0,0 +1,460 @@
+import asyncio
+import hashlib
+import random
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Set, cast
+
+import models
+from starlette.concurrency import run_in_threadpool
+
+from utils.db_engine import execute_query
+from utils.downsample import downsample_options, downsample_result
+from utils.query_params import (
+    compile_statement,
+    declared_params,
+    param_types,
+    params_key,
+    resolve_params,
+)
+from utils.pubsub import broker, dataset_topic, widget_topic
+from utils.query_executor import run_query
+from utils.query_result import QueryResult
+from utils.result_cache import result_cache
+from utils.single_flight import query_flights
+from utils.scheduler import refresh_scheduler
+from utils.transforms import (
+    TransformError,
+    transform_key,
+    transform_options,
+    transform_result,
+)
+
+SQL_SOURCE_TYPES = ["mysql", "postgresql", "sqlite"]
+DEFAULT_REFRESH_INTERVAL = 300  # seconds, same as models.Dataset default
+
+_refreshing: Set[Hashable] = set()
+_background_tasks: Set["asyncio.Task[Any]"] = set()
+
+
+# 推送通道登记的组件配置；refs 为订阅该组件的推送连接数
+class WidgetWatch:
+    __slots__ = ("transform", "max_points", "refs")
+
+    def __init__(self, transform: List[Dict[str, Any]], max_points: Optional[int]):
+        self.transform = transform
+        self.max_points = max_points
+        self.refs = 0
+
+
+# 大屏推送通道中配置了 transform 的组件：dataset_id -> {widget_id: WidgetWatch}
+_watched_widgets: Dict[int, Dict[int, WidgetWatch]] = {}
+
+
+def dataset_ttl(dataset: models.Dataset) -> int:
+    interval = dataset.refresh_interval
+    if interval is None:
+        return DEFAULT_REFRESH_INTERVAL
+    return max(int(interval), 0)  # type: ignore
+
+
+# 脱离 ORM Session 的一次数据集查询，可安全地在后台线程中执行
+class DatasetQuery:
+    __slots__ = (
+        "dataset_id",
+        "datasource_id",
+        "ds_type",
+        "config",
+        "query",
+        "region",
+        "params",
+        "statement",
+        "key",
+        "ttl",
+        "downsample",
+        "transform",
+    )
+
+    def __init__(
+        self,
+        dataset_id: int,
+        datasource_id: int,
+        ds_type: str,
+        config: Dict[str, Any],
+        query: str,
+        region: Optional[str],
+        ttl: int,
+        downsample: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        statement: Any = None,
+        transform: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.dataset_id = dataset_id
+        self.datasource_id = datasource_id
+        self.ds_type = ds_type
+        self.config = config
+        self.query = query
+        self.region = region
+        self.ttl = ttl
+        self.downsample = downsample or {}
+        self.transform = transform or []
+        self.params = params or {}
+        self.statement = statement if statement is not None else query
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        self.key = (dataset_id, params_key(self.params), query_hash)
+
+    @classmethod
+    def from_dataset(
+        cls,
+        dataset: models.Dataset,
+        region: Optional[str] = None,
+        values: Optional[Mapping[str, Any]] = None,
+    ) -> Optional["DatasetQuery"]:
+        datasource = dataset.datasource
+        query = dataset.query_config.get("query")
+        if str(datasource.type) not in SQL_SOURCE_TYPES or not query:
+            return None
+
+        # 参数（含 region）以绑定变量传入，SQL 文本对所有取值保持不变
+        values = dict(values or {})
+        if region is not None:
+            values["region"] = region
+        declared = declared_params(query, dataset.query_config)
+        types = param_types(query, declared)
+        bound = {name for name, _ in types}
+        params = {
+            name: value
+            for name, value in resolve_params(declared, values).items()
+            if name in bound
+        }
+        # 未在 query_config.params 中声明的占位符（如旧数据集中的 :region）没有取值时
+        # 保持改为绑定变量之前的行为：不执行查询，返回 mock 数据（而不是绑定 NULL 得到空结果）
+        explicit = dataset.query_config.get("params") or {}
+        if any(params[name] is None and name not in explicit for name in bound):
+            return None
+
+        return cls(
+            cast(int, dataset.id),
+            cast(int, datasource.id),
+            str(datasource.type),
+            cast(Dict[str, Any], datasource.connection_config),
+            query,
+            region,
+            dataset_ttl(dataset),
+            downsample_options(dataset.query_config),
+            params,
+            compile_statement(query, types),
+            transform_options(dataset.query_config),
+        )
+
+    def run(self) -> QueryResult:
+        result = execute_query(
+            self.ds_type,
+            self.config,
+            self.statement,
+            datasource_id=self.datasource_id,
+            params=self.params,
+        )
+        result_cache.set(self.key, result, self.ttl)
+        return result
+
+    def max_points(self, requested: Optional[int] = None) -> Optional[int]:
+        if requested is not None:
+            return requested
+        configured = self.downsample.get("max_points")
+        return int(configured) if configured else None
+
+    def downsampled(self, result: QueryResult, max_points: Optional[int]) -> QueryResult:
+        # 降采样结果与原始结果一起缓存，原始结果变化（指纹不同）后自动失效
+        if not max_points or len(result) <= max_points:
+            return result
+        method = self.downsample.get("method")
+        key = self.key + ("downsample", method, max_points, result.fingerprint())
+        entry = result_cache.get(key)
+        if entry is not None:
+            return entry.value
+        reduced = downsample_result(
+            result,
+            max_points,
+            x=self.downsample.get("x"),
+            series=self.downsample.get("series"),
+            method=method,
+        )
+        result_cache.set(key, reduced, self.ttl)
+        return reduced
+
+    def bound_region(self) -> Optional[str]:
+        # 推送给同一主题所有订阅者的 region：SQL 未使用 region 时为 None
+        return self.params.get("region")
+
+    def transformed(self, result: QueryResult, steps: List[Dict[str, Any]]) -> QueryResult:
+        # 变换在共享的原始结果上执行，按步骤内容缓存；不同组件共用一次查询
+        if not steps:
+            return result
+        key = self.key + ("transform", transform_key(steps), result.fingerprint())
+        entry = result_cache.get(key)
+        if entry is not None:
+            return entry.value
+        shaped = transform_result(result, steps)
+        result_cache.set(key, shaped, self.ttl)
+        return shaped
+
+    def shaped(
+        self, result: QueryResult, steps: List[Dict[str, Any]], max_points: Optional[int]
+    ) -> QueryResult:
+        return self.downsampled(self.transformed(result, steps), max_points)
+
+    async def execute(self) -> QueryResult:
+        # 多个大屏同时打开或缓存同时过期时，相同数据集与参数的查询只向源库发送一次
+        return await query_flights.run(self.key, self._execute)
+
+    async def _execute(self) -> QueryResult:
+        result = await run_query(self.datasource_id, self.run, connection_config=self.config)
+        # 结果变化时推送给订阅了该数据集的大屏
+        # 推送的数据与 /data、render 一致：先应用数据集的 transform，再降采样
+        topic = dataset_topic(self.key)
+        if broker.has_subscribers(topic):
+            pushed = await run_in_threadpool(
+                self.shaped, result, self.transform, self.max_points()
+            )
+            broker.publish_if_changed(
+                topic,
+                result.fingerprint(),
+                "dataset",
+                lambda: {
+                    "dataset_id": self.dataset_id,
+                    "region": self.bound_region(),
+                    "data": pushed.records(),
+                },
+            )
+        await self._push_widgets(result)
+        return result
+
+    async def _push_widgets(self, result: QueryResult) -> None:
+        # 配置了 transform 的组件各自推送变换后的结果，变换结果不变时不推送
+        for widget_id, watch in list(_watched_widgets.get(self.dataset_id, {}).items()):
+            topic = widget_topic(widget_id, self.key)
+            if not broker.has_subscribers(topic):
+                continue
+            try:
+                shaped = await run_in_threadpool(
+                    self.shaped, result, watch.transform, watch.max_points
+                )
+            except TransformError as e:
+                print(f"Transform for widget {widget_id} failed: {e}")
+                continue
+            broker.publish_if_changed(
+                topic,
+                shaped.fingerprint(),
+                "widget",
+                lambda widget_id=widget_id, shaped=shaped: {
+                    "widget_id": widget_id,
+                    "dataset_id": self.dataset_id,
+                    "region": self.bound_region(),
+                    "data": shaped.records(),
+                },
+            )
+
+
+async def _refresh(spec: DatasetQuery) -> None:
+    try:
+        await spec.execute()
+    except Exception as e:
+        print(f"Background refresh of dataset {spec.dataset_id} failed: {e}")
+    finally:
+        _refreshing.discard(spec.key)
+
+
+def schedule_refresh(spec: DatasetQuery) -> None:
+    if spec.key in _refreshing:
+        return
+    _refreshing.add(spec.key)
+    task = asyncio.create_task(_refresh(spec))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def fetch_dataset_result(spec: DatasetQuery) -> QueryResult:
+    refresh_scheduler.touch(spec)
+    entry = result_cache.get(spec.key)
+    if entry is not None:
+        if entry.is_fresh():
+            return entry.value
+        if entry.is_revalidatable():
+            schedule_refresh(spec)
+            return entry.value
+
+    try:
+        return await spec.execute()
+    except Exception as e:
+        if entry is None:
+            raise
+        # 源库异常时返回最近一次成功的结果
+        print(f"Query for dataset {spec.dataset_id} failed, serving last good result: {e}")
+        return entry.value
+
+
+async def fetch_downsampled_result(
+    spec: DatasetQuery,
+    max_points: Optional[int] = None,
+    transform: Optional[List[Dict[str, Any]]] = None,
+) -> QueryResult:
+    # transform 为 None 时使用数据集 query_config 中的默认变换；先变换再降采样
+    result = await fetch_dataset_result(spec)
+    steps = spec.transform if transform is None else transform
+    max_points = spec.max_points(max_points)
+    if not steps and (not max_points or len(result) <= max_points):
+        return result
+    return await run_in_threadpool(spec.shaped, result, steps, max_points)
+
+
+def transform_mock_data(
+    dataset: models.Dataset, data: Any, transform: Optional[List[Dict[str, Any]]] = None
+) -> Optional[QueryResult]:
+    steps = transform_options(dataset.query_config) if transform is None else transform
+    if not steps:
+        return None
+    return transform_result(QueryResult.from_data(data), steps)
+
+
+async def load_dataset_data(
+    dataset: models.Dataset,
+    region: Optional[str] = None,
+    max_points: Optional[int] = None,
+    transform: Optional[List[Dict[str, Any]]] = None,
+) -> Any:
+    # 与 /api/datasets/{id}/data 默认格式一致：SQL 数据集返回行列表，其余返回 mock 数据
+    spec = DatasetQuery.from_dataset(dataset, region)
+    if spec is None:
+        data = mock_dataset_data(dataset, region)
+        result = transform_mock_data(dataset, data, transform)
+        return data if result is None else result.records()
+    result = await fetch_downsampled_result(spec, max_points, transform)
+    return result.records()
+
+
+def watch_widget(
+    dataset_id: int,
+    widget_id: int,
+    transform: List[Dict[str, Any]],
+    max_points: Optional[int] = None,
+) -> WidgetWatch:
+    # 由推送通道在订阅组件主题时登记，数据集刷新时据此生成组件的推送数据；
+    # 连接关闭时以返回值调用 unwatch_widget。配置已变化时以新配置替换旧登记
+    widgets = _watched_widgets.setdefault(dataset_id, {})
+    watch = widgets.get(widget_id)
+    if watch is None or watch.transform != transform or watch.max_points != max_points:
+        watch = widgets[widget_id] = WidgetWatch(transform, max_points)
+    watch.refs += 1
+    return watch
+
+
+def unwatch_widget(dataset_id: int, widget_id: int, watch: WidgetWatch) -> None:
+    watch.refs -= 1
+    widgets = _watched_widgets.get(dataset_id)
+    if watch.refs > 0 or widgets is None or widgets.get(widget_id) is not watch:
+        return
+    del widgets[widget_id]
+    if not widgets:
+        del _watched_widgets[dataset_id]
+
+
+def forget_widget(widget_id: int) -> None:
+    # 组件被修改或删除：移除登记，仍打开的推送连接重连后按新配置登记
+    for dataset_id, widgets in list(_watched_widgets.items()):
+        if widgets.pop(widget_id, None) is not None and not widgets:
+            del _watched_widgets[dataset_id]
+
+
+def invalidate_dataset(dataset_id: int) -> None:
+    result_cache.invalidate(dataset_id)
+    refresh_scheduler.forget(dataset_id)
+
+
+def mock_dataset_data(dataset: models.Dataset, region: Optional[str] = None) -> Any:
+    # Generate mock data based on query_config['type']
+    data_type = dataset.query_config.get("type", "list")
+    mock_data = dataset.query_config.get("mock_data")
+
+    # Simple multiplier based on region for mock linkage
+    multiplier = 1.0
+    if region:
+        # Generate a semi-deterministic multiplier based on region name
+        # Sum ASCII values to make it more variable
+        region_sum = sum(ord(c) for c in region)
+        multiplier = (region_sum % 10 + 5) / 10.0  # Range 0.5 to 1.4
+
+    if mock_data:
+        # Apply multiplier to mock data if region is provided
+        if region:
+            if isinstance(mock_data, list):
+                new_mock = []
+                for item in mock_data:
+                    new_item = item.copy()
+                    if "value" in new_item:
+                        val = new_item["value"]
+                        if isinstance(val, list):
+                            new_item["value"] = [
+                                int(v * multiplier)
+                                if isinstance(v, (int, float))
+                                else v
+                                for v in val
+                            ]
+                        elif isinstance(val, (int, float)):
+                            new_item["value"] = int(val * multiplier)
+                    new_mock.append(new_item)
+                return new_mock
+            elif isinstance(mock_data, dict):
+                new_mock = mock_data.copy()
+                if "value" in new_mock and isinstance(new_mock["value"], (int, float)):
+                    new_mock["value"] = int(new_mock["value"] * multiplier)
+                return new_mock
+        return mock_data
+
+    if data_type == "chart":
+        labels = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+        return [
+            {"label": label, "value": int(random.randint(10, 100) * multiplier)}
+            for label in labels
+        ]
+    elif data_type == "map" or data_type == "echarts_map":
+        # Mock China map data
+        provinces = [
+            "北京",
+            "上海",
+            "广东",
+            "江苏",
+            "浙江",
+            "山东",
+            "河南",
+            "湖北",
+            "四川",
+            "福建",
+        ]
+        return [{"name": p, "value": random.randint(100, 1000)} for p in provinces]
+    elif data_type == "table":
+        return [
+            {
+                "id": 1,
+                "name": f"Event A ({region or 'Global'})",
+                "status": "Active",
+                "time": "10:00",
+            },
+            {
+                "id": 2,
+                "name": f"Event B ({region or 'Global'})",
+                "status": "Pending",
+                "time": "10:05",
+            },
+            {
+                "id": 3,
+                "name": f"Event C ({region or 'Global'})",
+                "status": "Resolved",
+                "time": "10:10",
+            },
+        ]
+    elif data_type == "metric":
+        return {
+            "value": int(random.randint(1000, 9999) * multiplier),
+            "label": region or "总计",
+        }
+
+    return []
@@ -1,7 +1,62 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.orm import sessionmaker
-import pandas as pd
-from typing import Dict, Any, List
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+import hashlib
+import json
+import threading
+import time
+
+from utils.json_response import dump_json
+from utils.query_result import QueryResult
+
+# 外部数据源连接池配置（可在 connection_config 中按数据源覆盖 pool_size / max_overflow）
+ENGINE_POOL_SIZE = 5
+ENGINE_MAX_OVERFLOW = 5
+ENGINE_POOL_TIMEOUT = 10  # seconds to wait for a pooled connection
+ENGINE_POOL_RECYCLE = 1800  # seconds, recycle before server-side idle timeouts
+MAX_CACHED_ENGINES = 32
+ENGINE_IDLE_TIMEOUT = 600  # seconds an engine may sit unused before disposal
+
+# 数据集查询的语句超时（秒），可在 connection_config.statement_timeout 中按数据源覆盖，0 表示不限制
+DEFAULT_STATEMENT_TIMEOUT = 30.0
+
+PREVIEW_ROW_LIMIT = 10
+PREVIEW_STATEMENT_TIMEOUT = 5.0  # seconds
+SQLITE_PROGRESS_STEPS = 1000  # VM instructions between timeout checks
+
+# 流式输出（NDJSON）的批大小与上限
+STREAM_BATCH_SIZE = 1000
+STREAM_MAX_ROWS = 1_000_000
+STREAM_MAX_BYTES = 256 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+# 流式查询的语句超时只覆盖执行与首批读取，之后的耗时取决于客户端读取速度。
+# MySQL 的 MAX_EXECUTION_TIME 作用于整条语句且读取期间无法修改，流式查询改用该总时长上限（秒）
+STREAM_MAX_SECONDS = 600.0
+
+Statement = Union[str, TextClause]
+
+# (datasource_id, config fingerprint) -> [engine, last_used]
+_engines: "OrderedDict[Tuple[Optional[int], str], List[Any]]" = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+class QueryTimeout(Exception):
+    def __init__(self, seconds: float):
+        super().__init__(f"Query exceeded the {seconds:g}s statement timeout")
+        self.seconds = seconds
+
+
+def statement_timeout_seconds(config: Mapping[str, Any]) -> float:
+    try:
+        return max(float(config.get("statement_timeout", DEFAULT_STATEMENT_TIMEOUT)), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_STATEMENT_TIMEOUT
 
 
 def get_engine_url(ds_type: str, config: Dict[str, Any]) -> str:
@@ -18,25 +73,314 @@ def get_engine_url(ds_type: str, config: Dict[str, Any]) -> str:
         raise ValueError(f"Unsupported data source type: {ds_type}")
 
 
+def config_fingerprint(ds_type: str, config: Dict[str, Any]) -> str:
+    raw = json.dumps({"type": ds_type, "config": config}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _create_engine(ds_type: str, config: Dict[str, Any]) -> Engine:
+    url = get_engine_url(ds_type, config)
+    if ds_type == "sqlite":
+        return create_engine(
+            url, pool_pre_ping=True, connect_args={"check_same_thread": False}
+        )
+    return create_engine(
+        url,
+        pool_size=int(config.get("pool_size", ENGINE_POOL_SIZE)),
+        max_overflow=int(config.get("max_overflow", ENGINE_MAX_OVERFLOW)),
+        pool_timeout=ENGINE_POOL_TIMEOUT,
+        pool_recycle=ENGINE_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"connect_timeout": 5},
+    )
+
+
+def get_engine(
+    ds_type: str, config: Dict[str, Any], datasource_id: Optional[int] = None
+) -> Engine:
+    key = (datasource_id, config_fingerprint(ds_type, config))
+    now = time.monotonic()
+    evicted: List[Engine] = []
+    with _engines_lock:
+        entry = _engines.get(key)
+        if entry is not None:
+            entry[1] = now
+            _engines.move_to_end(key)
+            return entry[0]
+
+        # 同一数据源配置已变更：旧连接池不再可用
+        if datasource_id is not None:
+            for stale_key in [k for k in _engines if k[0] == datasource_id]:
+                evicted.append(_engines.pop(stale_key)[0])
+
+        engine = _create_engine(ds_type, config)
+        _engines[key] = [engine, now]
+
+        # LRU 顺序：先淘汰长时间空闲的，再按容量上限淘汰最久未用的
+        for old_key, (old_engine, last_used) in list(_engines.items()):
+            if old_key != key and now - last_used > ENGINE_IDLE_TIMEOUT:
+                evicted.append(_engines.pop(old_key)[0])
+        while len(_engines) > MAX_CACHED_ENGINES:
+            evicted.append(_engines.popitem(last=False)[1][0])
+
+    for old_engine in evicted:
+        old_engine.dispose()
+    return engine
+
+
+def dispose_engine(datasource_id: int) -> None:
+    with _engines_lock:
+        keys = [k for k in _engines if k[0] == datasource_id]
+        evicted = [_engines.pop(k)[0] for k in keys]
+    for engine in evicted:
+        engine.dispose()
+
+
+def dispose_all_engines() -> None:
+    with _engines_lock:
+        evicted = [entry[0] for entry in _engines.values()]
+        _engines.clear()
+    for engine in evicted:
+        engine.dispose()
+
+
 def test_connection(ds_type: str, config: Dict[str, Any]) -> bool:
+    # 测试连接使用一次性连接，不进入连接池注册表
+    engine = None
     try:
         url = get_engine_url(ds_type, config)
         engine = create_engine(
-            url, connect_args={"connect_timeout": 5} if ds_type != "sqlite" else {}
+            url,
+            poolclass=NullPool,
+            connect_args={"connect_timeout": 5} if ds_type != "sqlite" else {},
         )
         with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
+            with statement_timeout(connection, ds_type, statement_timeout_seconds(config)):
+                connection.execute(text("SELECT 1"))
         return True
     except Exception as e:
         print(f"Connection test failed: {e}")
         return False
+    finally:
+        if engine is not None:
+            engine.dispose()
+
+
+def _statement(query: Statement) -> TextClause:
+    return query if isinstance(query, TextClause) else text(query)
 
 
 def execute_query(
-    ds_type: str, config: Dict[str, Any], query: str
-) -> List[Dict[str, Any]]:
-    url = get_engine_url(ds_type, config)
-    engine = create_engine(url)
+    ds_type: str,
+    config: Dict[str, Any],
+    query: Statement,
+    datasource_id: Optional[int] = None,
+    params: Optional[Mapping[str, Any]] = None,
+) -> QueryResult:
+    # 直接从 DB-API 游标构建结果，不经过 pandas
+    engine = get_engine(ds_type, config, datasource_id)
+    timeout = statement_timeout_seconds(config)
+    with raise_on_timeout(timeout), engine.connect() as connection:
+        with statement_timeout(connection, ds_type, timeout):
+            result = connection.execute(_statement(query), dict(params or {}))
+            columns = list(result.keys())
+            rows = [tuple(row) for row in result.fetchall()]
+    return QueryResult(columns, rows)
+
+
+@contextmanager
+def raise_on_timeout(seconds: Optional[float]) -> Iterator[None]:
+    # 各方言超时的错误码不同，按耗时判断是否由语句超时中断
+    started = time.monotonic()
+    try:
+        yield
+    except DBAPIError as e:
+        if seconds and time.monotonic() - started >= seconds:
+            raise QueryTimeout(seconds) from e
+        raise
+
+
+def _keep_timeout() -> None:
+    pass
+
+
+@contextmanager
+def statement_timeout(
+    connection: Connection, ds_type: str, seconds: Optional[float]
+) -> Iterator[Callable[[], None]]:
+    # 按方言设置语句超时，退出时恢复连接状态，避免污染连接池中的连接。
+    # 产出的函数用于提前解除超时（流式读取首批数据之后），无法解除的方言为空操作
+    if not seconds or seconds <= 0:
+        yield _keep_timeout
+        return
+
+    millis = int(seconds * 1000)
+    if ds_type == "postgresql":
+        # SET LOCAL 仅在当前事务内生效；服务端游标的每次 FETCH 单独计时，无需解除
+        connection.execute(text(f"SET LOCAL statement_timeout = {millis}"))
+        yield _keep_timeout
+    elif ds_type == "mysql":
+        connection.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {millis}"))
+        try:
+            yield _keep_timeout
+        finally:
+            # 流式查询提前结束时连接可能已被丢弃
+            if not connection.invalidated:
+                connection.execute(text("SET SESSION MAX_EXECUTION_TIME = 0"))
+    elif ds_type == "sqlite":
+        raw = connection.connection.driver_connection
+        deadline = time.monotonic() + seconds
+        # 返回非零值会中断当前语句（sqlite3.OperationalError: interrupted）
+        raw.set_progress_handler(
+            lambda: 1 if time.monotonic() > deadline else 0, SQLITE_PROGRESS_STEPS
+        )
+        try:
+            yield lambda: raw.set_progress_handler(None, 0)
+        finally:
+            raw.set_progress_handler(None, 0)
+    else:
+        yield _keep_timeout
+
+
+def limit_query(query: str, limit: int) -> Optional[str]:
+    # 将 SELECT/WITH 查询包装为子查询，由数据库侧执行 LIMIT；其他语句返回 None
+    inner = query.strip().rstrip(";").strip()
+    keyword = inner.split(None, 1)[0].lower() if inner else ""
+    if keyword not in ("select", "with"):
+        return None
+    return f"SELECT * FROM ({inner}) AS _limited LIMIT {int(limit)}"
+
+
+def preview_query(
+    ds_type: str,
+    config: Dict[str, Any],
+    query: str,
+    datasource_id: Optional[int] = None,
+    limit: int = PREVIEW_ROW_LIMIT,
+    timeout: Optional[float] = PREVIEW_STATEMENT_TIMEOUT,
+    params: Optional[Mapping[str, Any]] = None,
+) -> Dict[str, Any]:
+    engine = get_engine(ds_type, config, datasource_id)
+    limited = limit_query(query, limit)
+    # 数据源配置了更短的语句超时时以其为准
+    configured = statement_timeout_seconds(config)
+    if configured and (not timeout or configured < timeout):
+        timeout = configured
+    with raise_on_timeout(timeout), engine.connect() as connection:
+        if limited is None:
+            # 无法包装的语句：使用服务端游标，只取前 limit 行
+            connection = connection.execution_options(
+                stream_results=True, max_row_buffer=limit
+            )
+        with statement_timeout(connection, ds_type, timeout):
+            result = connection.execute(text(limited or query), dict(params or {}))
+            try:
+                columns = list(result.keys())
+                rows = [tuple(row) for row in result.fetchmany(limit)]
+            finally:
+                result.close()
+        connection.rollback()
+
+    preview = QueryResult(columns, rows)
+    return {"columns": preview.column_types(), "rows": preview.records()}
+
+
+def encode_ndjson(
+    rows: Iterable[Dict[str, Any]],
+    max_rows: int = STREAM_MAX_ROWS,
+    max_bytes: int = STREAM_MAX_BYTES,
+) -> Iterator[bytes]:
+    # 每行一个 JSON 对象，最后一行为 {"_meta": {...}}，标明是否被截断。
+    # 多行合并为约 STREAM_CHUNK_BYTES 的分块输出：线程切换与压缩刷新按块而不是按行进行
+    count = 0
+    size = 0
+    reason = None
+    error = None
+    buffer: List[bytes] = []
+    buffered = 0
+    try:
+        for row in rows:
+            if count >= max_rows:
+                reason = "max_rows"
+                break
+            line = dump_json(row) + b"\n"
+            if size + len(line) > max_bytes:
+                reason = "max_bytes"
+                break
+            count += 1
+            size += len(line)
+            buffer.append(line)
+            buffered += len(line)
+            if buffered >= STREAM_CHUNK_BYTES:
+                yield b"".join(buffer)
+                buffer = []
+                buffered = 0
+    except Exception as e:
+        error = str(e)
+    finally:
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
+
+    meta = {
+        "rows": count,
+        "bytes": size,
+        # 出错中断时同样视为不完整
+        "truncated": reason is not None or error is not None,
+        "reason": reason,
+        "error": error,
+    }
+    buffer.append(dump_json({"_meta": meta}) + b"\n")
+    yield b"".join(buffer)
+
+
+def iter_query_rows(
+    ds_type: str,
+    config: Dict[str, Any],
+    query: Statement,
+    datasource_id: Optional[int] = None,
+    batch_size: int = STREAM_BATCH_SIZE,
+    params: Optional[Mapping[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    engine = get_engine(ds_type, config, datasource_id)
+    timeout = statement_timeout_seconds(config)
+    if ds_type == "mysql" and timeout:
+        timeout = max(timeout, STREAM_MAX_SECONDS)
+    # 语句超时覆盖执行与首批读取：首行迟迟不返回的查询会被中断，超时以 QueryTimeout 抛出，
+    # 由 encode_ndjson 写入 _meta.error；之后解除超时，客户端读取较慢的大导出不受影响
     with engine.connect() as connection:
-        df = pd.read_sql(text(query), connection)
-        return df.to_dict(orient="records")
+        with statement_timeout(connection, ds_type, timeout) as lift_timeout:
+            result = None
+            exhausted = False
+            try:
+                with raise_on_timeout(timeout):
+                    result = connection.execution_options(
+                        stream_results=True, max_row_buffer=batch_size
+                    ).execute(_statement(query), dict(params or {}))
+                    columns = list(result.keys())
+                    batch = result.fetchmany(batch_size)
+                lift_timeout()
+                while batch:
+                    for row in batch:
+                        yield dict(zip(columns, row))
+                    batch = result.fetchmany(batch_size)
+                exhausted = True
+            finally:
+                if result is not None and not exhausted and ds_type == "mysql":
+                    # 提前结束时 MySQL 非缓冲游标会在 close 时读完剩余结果，直接丢弃该连接
+                    connection.invalidate()
+                elif result is not None:
+                    result.close()
+
+
+def stream_query(
+    ds_type: str,
+    config: Dict[str, Any],
+    query: Statement,
+    datasource_id: Optional[int] = None,
+    max_rows: int = STREAM_MAX_ROWS,
+    max_bytes: int = STREAM_MAX_BYTES,
+    params: Optional[Mapping[str, Any]] = None,
+) -> Iterator[bytes]:
+    rows = iter_query_rows(ds_type, config, query, datasource_id, params=params)
+    return encode_ndjson(rows, max_rows=max_rows, max_bytes=max_bytes)
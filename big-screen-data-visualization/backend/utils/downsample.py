@@ -0,0 +1,213 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.query_result import QueryResult
+
+LTTB_METHOD = "lttb"
+MINMAX_METHOD = "minmax"
+DOWNSAMPLE_METHODS = [LTTB_METHOD, MINMAX_METHOD]
+MIN_POINTS = 3
+
+_NUMERIC_TYPES = ("integer", "number")
+_TIME_TYPES = ("datetime", "date")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets：桶均值向量化计算，逐桶选点
+    length = len(x)
+    if n >= length or n < MIN_POINTS:
+        return np.arange(length)
+    # 首尾点固定保留，中间 length - 2 个点等分为 n - 2 个桶
+    edges = np.linspace(0, length - 2, n - 1).astype(np.int64) + 1
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+    # 每个桶的三角形第三个顶点是下一个桶的均值，最后一个桶用末点
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx = x[lo:hi]
+        by = y[lo:hi]
+        area = np.abs(
+            (x[a] - next_x[i]) * (by - y[a]) - (x[a] - bx) * (next_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    # 每个桶保留最小值和最大值，保证尖峰不被平滑掉
+    length = len(y)
+    if n >= length or n < MIN_POINTS:
+        return np.arange(length)
+    buckets = max((n - 2) // 2, 1)
+    size = -(-length // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:length] = y
+    padded = padded.reshape(buckets, size)
+    valid = ~np.all(np.isnan(padded), axis=1)
+    offsets = np.arange(buckets)[valid] * size
+    rows = padded[valid]
+    indices = np.concatenate(
+        [
+            [0, length - 1],
+            offsets + np.nanargmin(rows, axis=1),
+            offsets + np.nanargmax(rows, axis=1),
+        ]
+    )
+    return np.unique(indices)
+
+
+_SELECTORS = {LTTB_METHOD: lttb_indices, MINMAX_METHOD: minmax_indices}
+
+
+def _to_float(value: Any) -> float:
+    if value is None:
+        return np.nan
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).timestamp()
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    if isinstance(value, str):
+        parsed = _parse_time(value)
+        return np.nan if parsed is None else parsed.timestamp()
+    return np.nan
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    # SQLite 等数据源的时间列以 ISO 格式文本返回
+    if not isinstance(value, str) or len(value) < 10:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
+def _float_array(values: Sequence[Any]) -> np.ndarray:
+    try:
+        # 纯数值列直接转换，避免逐个判断类型
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.fromiter((_to_float(v) for v in values), dtype=np.float64, count=len(values))
+
+
+def _pick_x_column(
+    types: List[str],
+    columns: List[str],
+    arrays: List[List[Any]],
+    x: Optional[str],
+    series_index: Optional[int],
+) -> Optional[int]:
+    if x is not None:
+        return columns.index(x) if x in columns else None
+    for i, t in enumerate(types):
+        if t in _TIME_TYPES:
+            return i
+    for i, t in enumerate(types):
+        if t == "string" and i != series_index:
+            first = next((v for v in arrays[i] if v is not None), None)
+            if _parse_time(first) is not None:
+                return i
+    # 没有时间列时，仅在还剩其他数值列作为 y 时把第一个数值列当作 x，否则按行号
+    numeric = [i for i, t in enumerate(types) if t in _NUMERIC_TYPES and i != series_index]
+    return numeric[0] if len(numeric) > 1 else None
+
+
+def downsample_result(
+    result: QueryResult,
+    max_points: int,
+    x: Optional[str] = None,
+    series: Optional[str] = None,
+    method: str = LTTB_METHOD,
+) -> QueryResult:
+    # 对每条数值序列（及 series 列的每个分组）分别降采样到 max_points 个点，
+    # 返回所有序列所选行的并集，保持原有列结构
+    if len(result) <= max_points:
+        return result
+    select = _SELECTORS[method]
+    columns = result.columns
+    arrays = result.arrays()
+    types = [c["type"] for c in result.column_types()]
+
+    series_index = columns.index(series) if series in columns else None
+    x_index = _pick_x_column(types, columns, arrays, x, series_index)
+    y_indices = [
+        i
+        for i, t in enumerate(types)
+        if t in _NUMERIC_TYPES and i != x_index and i != series_index
+    ]
+    if not y_indices:
+        return result
+
+    x_values = None if x_index is None else _float_array(arrays[x_index])
+    if x_values is None or np.isnan(x_values).all():
+        x_index = None
+        x_values = np.arange(len(result), dtype=np.float64)
+    y_values = [np.nan_to_num(_float_array(arrays[i])) for i in y_indices]
+
+    if series_index is None:
+        groups = [np.arange(len(result))]
+    else:
+        labels = np.asarray([str(v) for v in arrays[series_index]])
+        _, inverse = np.unique(labels, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        groups = np.split(order, np.flatnonzero(np.diff(inverse[order])) + 1)
+
+    keep: List[np.ndarray] = []
+    for group in groups:
+        # 组内按 x 排序后选点，再映射回原始行号
+        group = group[np.argsort(x_values[group], kind="stable")]
+        gx = x_values[group]
+        for y in y_values:
+            keep.append(group[select(gx, y[group], max_points)])
+
+    selected = np.unique(np.concatenate(keep))
+    if x_index is not None:
+        selected = selected[np.argsort(x_values[selected], kind="stable")]
+    rows = result.rows
+    return QueryResult(columns, [rows[i] for i in selected.tolist()])
+
+
+def downsample_options(config: Any) -> Dict[str, Any]:
+    # query_config["downsample"] / widget config 中的降采样设置
+    if not isinstance(config, dict):
+        return {}
+    options = config.get("downsample")
+    if isinstance(options, dict):
+        options = dict(options)
+    else:
+        options = {}
+    if options.get("max_points") is None and config.get("max_points") is not None:
+        options["max_points"] = config.get("max_points")
+    if options.get("method") not in DOWNSAMPLE_METHODS:
+        options["method"] = LTTB_METHOD
+    return options
+
+
+class DownsampleError(ValueError):
+    pass
+
+
+def widget_max_points(config: Any) -> Optional[int]:
+    # 组件 config 中的 max_points：未配置或为 0 时返回 None，非整数或小于 MIN_POINTS 时报错
+    points = downsample_options(config).get("max_points")
+    if points is None or points == "" or points == 0:
+        return None
+    if isinstance(points, str) and points.strip().isdigit():
+        points = int(points)
+    if isinstance(points, bool) or not isinstance(points, int) or points < MIN_POINTS:
+        raise DownsampleError(f"max_points must be an integer >= {MIN_POINTS}")
+    return points
@@ -0,0 +1,71 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Tuple
+
+# 按用户名限制登录失败次数：窗口内失败过多时直接返回 429，不再消耗 bcrypt 计算
+LOGIN_MAX_FAILURES = 5
+LOGIN_FAILURE_WINDOW = 300  # seconds
+MAX_TRACKED_USERNAMES = 10000
+
+
+class LoginLimiter:
+    def __init__(
+        self,
+        max_failures: int = LOGIN_MAX_FAILURES,
+        window: float = LOGIN_FAILURE_WINDOW,
+    ):
+        self.max_failures = max_failures
+        self.window = window
+        self._failures: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, username: str, now: float) -> Deque[float]:
+        failures = self._failures.get(username)
+        if failures is None:
+            return deque()
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[username]
+        return failures
+
+    def reserve(self, username: str) -> Tuple[Optional[float], int]:
+        # 校验密码前预先记一次失败：并发的错误密码请求也受次数限制。
+        # 返回 (记录的时间戳, 0)；已超限时返回 (None, 需等待的秒数)
+        now = time.monotonic()
+        with self._lock:
+            failures = self._prune(username, now)
+            if len(failures) >= self.max_failures:
+                return None, max(math.ceil(failures[0] + self.window - now), 1)
+            if username not in self._failures:
+                self._evict(now)
+            self._failures.setdefault(username, deque()).append(now)
+            self._failures.move_to_end(username)
+            return now, 0
+
+    def release(self, username: str, stamp: float) -> None:
+        # 校验未完成（如数据库异常）时撤销预记的失败
+        with self._lock:
+            failures = self._failures.get(username)
+            if failures is not None and stamp in failures:
+                failures.remove(stamp)
+                if not failures:
+                    del self._failures[username]
+
+    def _evict(self, now: float) -> None:
+        if len(self._failures) < MAX_TRACKED_USERNAMES:
+            return
+        # 用户名过多（如撞库扫描）时先清理已过期的记录，仍超限则淘汰最久未尝试的用户名
+        for name in list(self._failures):
+            self._prune(name, now)
+        while len(self._failures) >= MAX_TRACKED_USERNAMES:
+            self._failures.popitem(last=False)
+
+    def reset(self, username: str) -> None:
+        with self._lock:
+            self._failures.pop(username, None)
+
+
+login_limiter = LoginLimiter()
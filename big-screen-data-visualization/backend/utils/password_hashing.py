@@ -0,0 +1,44 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# bcrypt 每次约 250ms CPU：放到专用线程池执行（bcrypt 计算时释放 GIL），不阻塞事件循环
+PASSWORD_HASH_WORKERS = min(4, os.cpu_count() or 1)
+# 排队等待的哈希任务上限，超出时直接拒绝（503），不让登录洪峰无限堆积
+MAX_PENDING_PASSWORD_HASHES = 64
+PASSWORD_POOL_RETRY_AFTER = 1  # seconds
+
+_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+async def run_password_task(fn: Callable[..., T], *args: Any) -> T:
+    global _pending
+    with _pending_lock:
+        if _pending >= MAX_PENDING_PASSWORD_HASHES:
+            raise PasswordPoolBusy()
+        _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+def pending_password_tasks() -> int:
+    return _pending
+
+
+def shutdown_password_pool() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
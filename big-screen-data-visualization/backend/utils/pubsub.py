@@ -0,0 +1,93 @@
+import asyncio
+from typing import Any, Dict, Hashable, Iterable, Set
+
+from utils.json_response import dump_json
+
+SUBSCRIBER_QUEUE_SIZE = 32
+KEEPALIVE_INTERVAL = 15  # seconds
+
+ALARMS_TOPIC = "alarms"
+KEEPALIVE_FRAME = b": keepalive\n\n"
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+
+# 主题按数据集查询键（数据集 + 实际绑定的参数）区分，与结果缓存、合并查询的键一致：
+# SQL 未使用 region 时，不同 region 的大屏订阅同一主题
+def dataset_topic(query_key: Hashable) -> Hashable:
+    return ("dataset", query_key)
+
+
+def widget_topic(widget_id: int, query_key: Hashable) -> Hashable:
+    return ("widget", widget_id, query_key)
+
+
+def encode_event(event: str, payload: Any) -> bytes:
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + dump_json(payload) + b"\n\n"
+
+
+class Subscriber:
+    def __init__(self, topics: Iterable[Hashable]):
+        self.topics: Set[Hashable] = set(topics)
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def push(self, frame: bytes) -> None:
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # 慢消费者：丢弃积压，通知客户端重新同步
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(RESYNC_FRAME)
+            self.queue.put_nowait(frame)
+
+
+# 进程内发布/订阅：每条消息只编码一次，所有订阅者共享同一份字节
+class Broker:
+    def __init__(self):
+        self._topics: Dict[Hashable, Set[Subscriber]] = {}
+        self._fingerprints: Dict[Hashable, str] = {}
+
+    def subscribe(self, topics: Iterable[Hashable]) -> Subscriber:
+        subscriber = Subscriber(topics)
+        for topic in subscriber.topics:
+            self._topics.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        for topic in subscriber.topics:
+            subs = self._topics.get(topic)
+            if subs is None:
+                continue
+            subs.discard(subscriber)
+            if not subs:
+                del self._topics[topic]
+                self._fingerprints.pop(topic, None)
+
+    def has_subscribers(self, topic: Hashable) -> bool:
+        return bool(self._topics.get(topic))
+
+    def publish(self, topic: Hashable, event: str, payload: Any) -> None:
+        subs = self._topics.get(topic)
+        if not subs:
+            return
+        frame = encode_event(event, payload)
+        for subscriber in list(subs):
+            subscriber.push(frame)
+
+    def publish_if_changed(
+        self, topic: Hashable, fingerprint: str, event: str, payload_factory: Any
+    ) -> bool:
+        # 仅为有订阅者的主题记录哈希；与上一次推送相同则跳过
+        if not self.has_subscribers(topic):
+            self._fingerprints.pop(topic, None)
+            return False
+        if self._fingerprints.get(topic) == fingerprint:
+            return False
+        self._fingerprints[topic] = fingerprint
+        self.publish(topic, event, payload_factory())
+        return True
+
+
+broker = Broker()
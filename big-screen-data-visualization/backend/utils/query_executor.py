@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from starlette.requests import Request
+
+T = TypeVar("T")
+
+# 外部数据源查询专用线程池，阻塞的驱动调用不会占用事件循环
+QUERY_EXECUTOR_MAX_WORKERS = 16
+# 每个数据源同时执行的查询数与排队数上限，避免一个慢库占满线程池；
+# 可在 connection_config 中按数据源覆盖 max_concurrent_queries / max_queued_queries
+MAX_CONCURRENT_QUERIES_PER_DATASOURCE = 4
+MAX_QUEUED_QUERIES_PER_DATASOURCE = 16
+DATASOURCE_BUSY_RETRY_AFTER = 2  # seconds
+DISCONNECT_POLL_INTERVAL = 0.5  # seconds
+
+_executor = ThreadPoolExecutor(
+    max_workers=QUERY_EXECUTOR_MAX_WORKERS, thread_name_prefix="dataset-query"
+)
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class DatasourceBusy(Exception):
+    def __init__(self, datasource_id: int, retry_after: int = DATASOURCE_BUSY_RETRY_AFTER):
+        super().__init__(f"Datasource {datasource_id} is busy, retry later")
+        self.retry_after = retry_after
+
+
+class DatasourceLimiter:
+    def __init__(self, datasource_id: int, max_concurrent: int, max_queued: int):
+        self.datasource_id = datasource_id
+        self.limits = (max_concurrent, max_queued)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+
+    def check(self) -> None:
+        # 排队已满时立即拒绝，不再堆积等待的请求
+        if self._semaphore.locked() and self.waiting >= self.limits[1]:
+            raise DatasourceBusy(self.datasource_id)
+
+    async def acquire(self) -> None:
+        self.check()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# asyncio.Semaphore 绑定事件循环，按循环分别维护
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[int, DatasourceLimiter]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _positive_int(config: Mapping[str, Any], key: str, default: int) -> int:
+    try:
+        return max(int(config.get(key, default)), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def datasource_limits(connection_config: Optional[Mapping[str, Any]]) -> Tuple[int, int]:
+    config = connection_config or {}
+    return (
+        max(_positive_int(config, "max_concurrent_queries", MAX_CONCURRENT_QUERIES_PER_DATASOURCE), 1),
+        _positive_int(config, "max_queued_queries", MAX_QUEUED_QUERIES_PER_DATASOURCE),
+    )
+
+
+def datasource_limiter(
+    datasource_id: int, connection_config: Optional[Mapping[str, Any]] = None
+) -> DatasourceLimiter:
+    loop = asyncio.get_running_loop()
+    per_loop = _limiters.setdefault(loop, {})
+    limits = datasource_limits(connection_config)
+    limiter = per_loop.get(datasource_id)
+    if limiter is None or limiter.limits != limits:
+        # 数据源的限制被修改：新请求使用新的限制，进行中的查询在旧限制器上结束
+        limiter = DatasourceLimiter(datasource_id, *limits)
+        per_loop[datasource_id] = limiter
+    return limiter
+
+
+async def run_query(
+    datasource_id: int,
+    fn: Callable[..., T],
+    *args: Any,
+    connection_config: Optional[Mapping[str, Any]] = None,
+    **kwargs: Any,
+) -> T:
+    # 在排队时被取消的任务不会提交到线程池；排队已满时抛出 DatasourceBusy
+    limiter = datasource_limiter(datasource_id, connection_config)
+    await limiter.acquire()
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+    except BaseException:
+        limiter.release()
+        raise
+    # 调用方被取消（客户端断开等）时线程中的查询仍在占用连接，名额在查询真正结束时才释放
+    future.add_done_callback(functools.partial(_release_when_done, limiter))
+    return await asyncio.shield(future)
+
+
+def _release_when_done(limiter: DatasourceLimiter, future: "asyncio.Future[Any]") -> None:
+    limiter.release()
+    # 调用方已离开时避免出现 "Future exception was never retrieved"
+    if not future.cancelled():
+        future.exception()
+
+
+_SENTINEL = object()
+
+
+async def iterate_in_executor(
+    datasource_id: int,
+    iterator: Iterator[T],
+    connection_config: Optional[Mapping[str, Any]] = None,
+) -> AsyncIterator[T]:
+    # 流式结果：整个读取过程占用一个数据源并发名额，每批在线程池中拉取
+    loop = asyncio.get_running_loop()
+    async with datasource_limiter(datasource_id, connection_config).slot():
+        pending: Optional["asyncio.Future[Any]"] = None
+        try:
+            while True:
+                pending = loop.run_in_executor(_executor, next, iterator, _SENTINEL)
+                item = await asyncio.shield(pending)
+                if item is _SENTINEL:
+                    break
+                yield item  # type: ignore
+        finally:
+            # 被取消时等正在拉取的批次结束再关闭迭代器，之后才释放名额
+            if pending is not None and not pending.done():
+                await asyncio.wait({pending})
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                await loop.run_in_executor(_executor, close)
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def shutdown_executor() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
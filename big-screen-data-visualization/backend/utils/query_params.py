@@ -0,0 +1,110 @@
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Mapping, Tuple
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, String, bindparam, text
+from sqlalchemy.sql.elements import TextClause
+
+# query_config["params"] 中声明的参数类型，例如：
+#   {"region": {"type": "string"},
+#    "start": {"type": "datetime"}, "end": {"type": "datetime"},
+#    "limit": {"type": "integer", "default": 100}}
+PARAM_TYPES = {
+    "string": String,
+    "integer": Integer,
+    "number": Float,
+    "boolean": Boolean,
+    "date": Date,
+    "datetime": DateTime,
+}
+DEFAULT_PARAM_TYPE = "string"
+MAX_COMPILED_STATEMENTS = 256
+
+# 与 sqlalchemy.text() 识别绑定参数的规则一致（跳过 PostgreSQL 的 :: 类型转换）
+_BIND_RE = re.compile(r"(?<![:\w\x5c]):(\w+)(?!:)")
+_TRUE_VALUES = {"1", "true", "yes", "on"}
+_FALSE_VALUES = {"0", "false", "no", "off"}
+
+ParamTypes = Tuple[Tuple[str, str], ...]
+
+
+class QueryParamError(ValueError):
+    pass
+
+
+def declared_params(query: str, query_config: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # 查询中出现但未声明的占位符（如旧数据集中的 :region）按可选字符串参数处理
+    declared: Dict[str, Dict[str, Any]] = {}
+    for name, spec in (query_config.get("params") or {}).items():
+        spec = dict(spec) if isinstance(spec, dict) else {"type": spec}
+        if spec.get("type", DEFAULT_PARAM_TYPE) not in PARAM_TYPES:
+            raise QueryParamError(f"Unknown type for parameter '{name}': {spec.get('type')}")
+        declared[name] = spec
+    for name in _BIND_RE.findall(query):
+        declared.setdefault(name, {"type": DEFAULT_PARAM_TYPE})
+    return declared
+
+
+def coerce_param(name: str, value: Any, type_name: str) -> Any:
+    if value is None or (isinstance(value, bool) and type_name == "boolean"):
+        return value
+    try:
+        if type_name == "integer":
+            return int(value)
+        if type_name == "number":
+            return float(value)
+        if type_name == "boolean":
+            lowered = str(value).strip().lower()
+            if lowered in _TRUE_VALUES:
+                return True
+            if lowered in _FALSE_VALUES:
+                return False
+            raise ValueError(value)
+        if type_name == "date":
+            return value if isinstance(value, date) else date.fromisoformat(str(value))
+        if type_name == "datetime":
+            if isinstance(value, datetime):
+                return value
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        raise QueryParamError(f"Invalid {type_name} value for parameter '{name}': {value}")
+    return str(value)
+
+
+def resolve_params(
+    declared: Mapping[str, Mapping[str, Any]], values: Mapping[str, Any]
+) -> Dict[str, Any]:
+    resolved: Dict[str, Any] = {}
+    for name, spec in declared.items():
+        value = values.get(name)
+        if value is None or value == "":
+            value = spec.get("default")
+        if value is None and spec.get("required"):
+            raise QueryParamError(f"Missing required parameter '{name}'")
+        resolved[name] = coerce_param(name, value, spec.get("type", DEFAULT_PARAM_TYPE))
+    return resolved
+
+
+def param_types(query: str, declared: Mapping[str, Mapping[str, Any]]) -> ParamTypes:
+    # 只绑定查询中实际出现的参数，保证同一数据集的 SQL 文本与类型签名固定
+    names = set(_BIND_RE.findall(query))
+    return tuple(
+        sorted(
+            (name, spec.get("type", DEFAULT_PARAM_TYPE))
+            for name, spec in declared.items()
+            if name in names
+        )
+    )
+
+
+@lru_cache(maxsize=MAX_COMPILED_STATEMENTS)
+def compile_statement(query: str, types: ParamTypes) -> TextClause:
+    # 同一 SQL 文本复用同一个 TextClause：SQLAlchemy 的编译缓存与数据库侧的执行计划均可命中
+    return text(query).bindparams(
+        *(bindparam(name, type_=PARAM_TYPES[type_name]()) for name, type_name in types)
+    )
+
+
+def params_key(params: Mapping[str, Any]) -> Hashable:
+    return tuple(sorted((name, value) for name, value in params.items()))
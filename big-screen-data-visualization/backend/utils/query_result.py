@@ -0,0 +1,177 @@
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import io
+import json
+
+import msgpack
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # pyarrow 为可选依赖，未安装时不提供 Arrow 输出
+    pa = None
+    pa_ipc = None
+
+RECORDS_FORMAT = "records"
+COLUMNAR_FORMAT = "columnar"
+MSGPACK_FORMAT = "msgpack"
+ARROW_FORMAT = "arrow"
+
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.dataset.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_ACCEPT_FORMATS = [
+    (ARROW_MEDIA_TYPE, ARROW_FORMAT),
+    (MSGPACK_MEDIA_TYPE, MSGPACK_FORMAT),
+    ("application/x-msgpack", MSGPACK_FORMAT),
+    (COLUMNAR_JSON_MEDIA_TYPE, COLUMNAR_FORMAT),
+]
+
+
+def negotiate_format(output_format: Optional[str], accept: Optional[str]) -> str:
+    # 显式的 ?format= 优先，其次按 Accept 头选择
+    if output_format:
+        return output_format
+    accept = (accept or "").lower()
+    for media_type, fmt in _ACCEPT_FORMATS:
+        if media_type in accept:
+            return fmt
+    return RECORDS_FORMAT
+
+
+def value_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, (float, Decimal)):
+        return "number"
+    if isinstance(value, datetime):
+        return "datetime"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, dt_time):
+        return "time"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "binary"
+    return "string"
+
+
+def _column_type(values: Sequence[Any]) -> str:
+    for v in values:
+        if v is not None:
+            return value_type(v)
+    return "unknown"
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, dt_time)):
+        return obj.isoformat()
+    return str(obj)
+
+
+# 查询结果的统一表示：列名 + 行元组，按需生成行字典或列数组并缓存
+class QueryResult:
+    __slots__ = ("columns", "rows", "_records", "_arrays", "_size", "_fingerprint")
+
+    def __init__(self, columns: List[str], rows: List[Tuple[Any, ...]]):
+        self.columns = columns
+        self.rows = rows
+        self._records: Optional[List[Dict[str, Any]]] = None
+        self._arrays: Optional[List[List[Any]]] = None
+        self._size: Optional[int] = None
+        self._fingerprint: Optional[str] = None
+
+    @classmethod
+    def from_data(cls, data: Any) -> "QueryResult":
+        # 兼容 mock 数据：对象列表、单个对象或标量列表
+        items = data if isinstance(data, list) else [data]
+        columns: List[str] = []
+        seen = set()
+        for item in items:
+            if isinstance(item, dict):
+                for key in item:
+                    if key not in seen:
+                        seen.add(key)
+                        columns.append(key)
+        if not columns:
+            return cls(["value"], [(item,) for item in items])
+        rows = [
+            tuple(item.get(c) if isinstance(item, dict) else None for c in columns)
+            for item in items
+        ]
+        return cls(columns, rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def records(self) -> List[Dict[str, Any]]:
+        if self._records is None:
+            columns = self.columns
+            self._records = [dict(zip(columns, row)) for row in self.rows]
+        return self._records
+
+    def arrays(self) -> List[List[Any]]:
+        if self._arrays is None:
+            if self.rows:
+                self._arrays = [list(col) for col in zip(*self.rows)]
+            else:
+                self._arrays = [[] for _ in self.columns]
+        return self._arrays
+
+    def column_types(self) -> List[Dict[str, str]]:
+        return [
+            {"name": name, "type": _column_type(values)}
+            for name, values in zip(self.columns, self.arrays())
+        ]
+
+    def columnar(self) -> Dict[str, Any]:
+        return {
+            "columns": self.columns,
+            "types": [c["type"] for c in self.column_types()],
+            "data": self.arrays(),
+            "rows": len(self.rows),
+        }
+
+    def _digest(self) -> None:
+        encoded = json.dumps([self.columns, self.rows], default=str).encode("utf-8")
+        self._size = len(encoded)
+        self._fingerprint = hashlib.sha1(encoded).hexdigest()
+
+    def estimate_size(self) -> int:
+        if self._size is None:
+            self._digest()
+        return self._size  # type: ignore
+
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._digest()
+        return self._fingerprint  # type: ignore
+
+    def to_msgpack(self) -> bytes:
+        return msgpack.packb(self.columnar(), default=_msgpack_default, use_bin_type=True)
+
+    def to_arrow(self) -> bytes:
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        arrays = []
+        for values in self.arrays():
+            try:
+                arrays.append(pa.array(values))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # 混合类型的列退化为字符串
+                arrays.append(pa.array([None if v is None else str(v) for v in values]))
+        table = pa.Table.from_arrays(arrays, names=self.columns)
+        sink = io.BytesIO()
+        with pa_ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+
+
+def arrow_available() -> bool:
+    return pa is not None
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional
+import json
+import threading
+import time
+
+# 数据集查询结果缓存的内存上限（按 JSON 编码后的字节数估算）
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# 单条结果超过该大小则不缓存，避免一个大结果挤掉所有其他条目
+RESULT_CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+
+
+def estimate_size(value: Any) -> int:
+    if hasattr(value, "estimate_size"):
+        return value.estimate_size()
+    return len(json.dumps(value, default=str, ensure_ascii=False))
+
+
+class CacheEntry:
+    __slots__ = ("value", "size", "stored_at", "ttl")
+
+    def __init__(self, value: Any, size: int, ttl: float):
+        self.value = value
+        self.size = size
+        self.stored_at = time.monotonic()
+        self.ttl = ttl
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    def is_fresh(self) -> bool:
+        return self.age < self.ttl
+
+    def is_revalidatable(self) -> bool:
+        # 过期后仍可在一个 TTL 内先返回旧值、后台刷新
+        return self.ttl > 0 and self.age < self.ttl * 2
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        max_entry_bytes: int = RESULT_CACHE_MAX_ENTRY_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> Optional[CacheEntry]:
+        size = estimate_size(value)
+        if size > self.max_entry_bytes:
+            self.delete(key)
+            return None
+        entry = CacheEntry(value, size, ttl)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+        return entry
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+
+    def invalidate(self, prefix: Hashable) -> int:
+        # 键为元组，按首元素（如 dataset_id）批量失效
+        with self._lock:
+            keys: List[Hashable] = [
+                k for k in self._entries if isinstance(k, tuple) and k[0] == prefix
+            ]
+            for k in keys:
+                self._bytes -= self._entries.pop(k).size
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+result_cache = ResultCache()
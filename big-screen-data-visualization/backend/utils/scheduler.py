@@ -0,0 +1,178 @@
+import asyncio
+import random
+import time
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+import models
+from database import ReadSessionLocal
+
+SCHEDULER_TICK_SECONDS = 1.0
+WIDGET_SCAN_INTERVAL = 60  # seconds between re-reading widgets -> datasets
+ACTIVE_WINDOW = 600  # only datasets requested within this window are pre-warmed
+REFRESH_JITTER = 0.2  # refresh between (1 - jitter) and 1.0 of the TTL
+MAX_BACKGROUND_REFRESHES_PER_DATASOURCE = 2
+
+
+class _Tracked:
+    __slots__ = (
+        "spec",
+        "last_requested",
+        "next_run",
+        "running",
+        "last_run",
+        "last_duration",
+        "last_error",
+        "runs",
+    )
+
+    def __init__(self, spec: Any):
+        self.spec = spec
+        self.last_requested = time.monotonic()
+        self.next_run = self.last_requested + _jittered(spec.ttl)
+        self.running = False
+        self.last_run: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.runs = 0
+
+
+def _jittered(ttl: float) -> float:
+    return ttl * (1 - REFRESH_JITTER * random.random())
+
+
+class RefreshScheduler:
+    def __init__(self):
+        self._tracked: Dict[Hashable, _Tracked] = {}
+        self._widget_datasets: Set[int] = set()
+        self._last_scan = 0.0
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._running_tasks: Set["asyncio.Task[None]"] = set()
+
+    # 由请求路径调用：记录最近被访问的数据集查询
+    def touch(self, spec: Any) -> None:
+        tracked = self._tracked.get(spec.key)
+        if tracked is None:
+            self._tracked[spec.key] = _Tracked(spec)
+        else:
+            tracked.spec = spec
+            tracked.last_requested = time.monotonic()
+
+    def forget(self, dataset_id: int) -> None:
+        for key in [k for k, t in self._tracked.items() if t.spec.dataset_id == dataset_id]:
+            del self._tracked[key]
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        for task in list(self._running_tasks):
+            task.cancel()
+        await asyncio.gather(self._task, *self._running_tasks, return_exceptions=True)
+        self._task = None
+
+    def _semaphore(self, datasource_id: int) -> asyncio.Semaphore:
+        sem = self._semaphores.get(datasource_id)
+        if sem is None:
+            sem = asyncio.Semaphore(MAX_BACKGROUND_REFRESHES_PER_DATASOURCE)
+            self._semaphores[datasource_id] = sem
+        return sem
+
+    @staticmethod
+    def _load_widget_datasets() -> Set[int]:
+        db = ReadSessionLocal()
+        try:
+            rows = (
+                db.query(models.Widget.dataset_id)
+                .filter(models.Widget.dataset_id.isnot(None))
+                .distinct()
+                .all()
+            )
+            return {row[0] for row in rows}
+        finally:
+            db.close()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Refresh scheduler tick failed: {e}")
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+    async def _tick(self) -> None:
+        now = time.monotonic()
+        if now - self._last_scan >= WIDGET_SCAN_INTERVAL:
+            self._widget_datasets = await run_in_threadpool(self._load_widget_datasets)
+            self._last_scan = now
+
+        for key, tracked in list(self._tracked.items()):
+            if now - tracked.last_requested > ACTIVE_WINDOW:
+                # 大屏已关闭：停止预热
+                del self._tracked[key]
+                continue
+            spec = tracked.spec
+            if (
+                tracked.running
+                or spec.ttl <= 0
+                or now < tracked.next_run
+                or spec.dataset_id not in self._widget_datasets
+            ):
+                continue
+            tracked.running = True
+            task = asyncio.create_task(self._run(tracked))
+            self._running_tasks.add(task)
+            task.add_done_callback(self._running_tasks.discard)
+
+    async def _run(self, tracked: _Tracked) -> None:
+        spec = tracked.spec
+        try:
+            async with self._semaphore(spec.datasource_id):
+                started = time.monotonic()
+                tracked.last_run = datetime.utcnow()
+                try:
+                    await spec.execute()
+                    tracked.last_error = None
+                except Exception as e:
+                    tracked.last_error = str(e)
+                tracked.last_duration = time.monotonic() - started
+                tracked.runs += 1
+        finally:
+            tracked.running = False
+            tracked.next_run = time.monotonic() + _jittered(spec.ttl)
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "dataset_id": t.spec.dataset_id,
+                "datasource_id": t.spec.datasource_id,
+                "region": t.spec.region,
+                "params": t.spec.params,
+                "active": t.spec.dataset_id in self._widget_datasets,
+                "running": t.running,
+                "runs": t.runs,
+                "last_run": t.last_run,
+                "last_duration_ms": (
+                    round(t.last_duration * 1000, 1)
+                    if t.last_duration is not None
+                    else None
+                ),
+                "last_error": t.last_error,
+                "next_run_in": round(max(t.next_run - now, 0), 1),
+                "last_requested_ago": round(now - t.last_requested, 1),
+            }
+            for t in self._tracked.values()
+        ]
+
+
+refresh_scheduler = RefreshScheduler()
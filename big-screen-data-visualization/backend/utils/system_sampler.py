@@ -0,0 +1,168 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import psutil
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from utils.alarm_coalescer import alarm_coalescer
+
+SAMPLE_INTERVAL = 2.0  # seconds
+HISTORY_SIZE = 1800  # 1 小时 @ 2 秒
+DEFAULT_HISTORY_POINTS = 120
+MAX_HISTORY_POINTS = 1000
+
+CPU_WARNING_THRESHOLD = 80.0
+CPU_CRITICAL_THRESHOLD = 90.0
+SYSTEM_MONITOR_SOURCE = "system_monitor"
+
+# 环形缓冲区中每个采样点的字段（列顺序即数组列下标）
+HISTORY_FIELDS = [
+    "cpu",
+    "memory",
+    "disk",
+    "load1",
+    "net_rx_bytes_per_sec",
+    "net_tx_bytes_per_sec",
+]
+
+_MB = 1024 * 1024
+DISK_PATH = os.path.abspath(os.sep)
+
+
+# 后台定时采集主机指标：/stats 只读内存中的最新快照，历史存放在定长数组环形缓冲区
+class SystemSampler:
+    def __init__(self, interval: float = SAMPLE_INTERVAL, size: int = HISTORY_SIZE):
+        self.interval = interval
+        self.size = size
+        self._timestamps = np.zeros(size, dtype=np.float64)
+        self._values = np.zeros((size, len(HISTORY_FIELDS)), dtype=np.float64)
+        self._head = 0  # 下一次写入位置
+        self._count = 0
+        self._lock = threading.Lock()
+        self._latest: Optional[Dict[str, Any]] = None
+        self._last_net: Optional[Any] = None
+        self._last_net_at = 0.0
+        self._cores = psutil.cpu_count() or 1
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                # psutil 读取在线程中进行；告警写入与 SSE 发布必须在事件循环线程中执行
+                snapshot = await run_in_threadpool(self.sample)
+                self._check_alarms(snapshot["cpu"]["usage"])
+            except Exception as e:
+                print(f"System sampling failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def latest(self) -> Dict[str, Any]:
+        if self._latest is None:
+            # 采样任务尚未运行（如未触发 startup）时同步采集一次
+            self.sample()
+        return self._latest  # type: ignore
+
+    def sample(self) -> Dict[str, Any]:
+        now = time.time()
+        cpu = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(DISK_PATH)
+        try:
+            load_average = [round(v, 2) for v in os.getloadavg()]
+        except (AttributeError, OSError):
+            load_average = [0.0, 0.0, 0.0]
+
+        net = psutil.net_io_counters()
+        rx_rate = tx_rate = 0.0
+        if self._last_net is not None and now > self._last_net_at:
+            elapsed = now - self._last_net_at
+            rx_rate = max(net.bytes_recv - self._last_net.bytes_recv, 0) / elapsed
+            tx_rate = max(net.bytes_sent - self._last_net.bytes_sent, 0) / elapsed
+        self._last_net = net
+        self._last_net_at = now
+
+        snapshot = {
+            "cpu": {
+                "usage": round(cpu, 1),
+                "cores": self._cores,
+                "load_average": load_average,
+            },
+            "memory": {
+                "total": round(memory.total / _MB),
+                "used": round(memory.used / _MB),
+                "usage_percent": round(memory.percent, 1),
+            },
+            "disk": {
+                "total": round(disk.total / _MB),
+                "used": round(disk.used / _MB),
+                "usage_percent": round(disk.percent, 1),
+            },
+            "network": {
+                "rx_bytes_per_sec": round(rx_rate),
+                "tx_bytes_per_sec": round(tx_rate),
+            },
+            "timestamp": int(now),
+        }
+        row = [cpu, memory.percent, disk.percent, load_average[0], rx_rate, tx_rate]
+        with self._lock:
+            self._timestamps[self._head] = now
+            self._values[self._head] = row
+            self._head = (self._head + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+        self._latest = snapshot
+        return snapshot
+
+    def _check_alarms(self, cpu: float) -> None:
+        if cpu > CPU_CRITICAL_THRESHOLD:
+            level, message = "critical", f"CPU usage critically high: {cpu:.1f}%"
+        elif cpu > CPU_WARNING_THRESHOLD:
+            level, message = "warning", f"CPU usage high: {cpu:.1f}%"
+        else:
+            return
+        with SessionLocal() as db:
+            alarm_coalescer.record(db, level, message, SYSTEM_MONITOR_SOURCE)
+
+    def history(self, window: float, points: int) -> Dict[str, Any]:
+        with self._lock:
+            count = self._count
+            # 按时间顺序取出环形缓冲区中的数据
+            order = (np.arange(count) + self._head - count) % self.size
+            timestamps = self._timestamps[order]
+            values = self._values[order]
+
+        mask = timestamps >= time.time() - window
+        timestamps = timestamps[mask]
+        values = values[mask]
+        if len(timestamps) > points:
+            # 等分为 points 个桶，每桶取平均值
+            starts = np.linspace(0, len(timestamps), points, endpoint=False).astype(np.int64)
+            counts = np.diff(np.append(starts, len(timestamps)))
+            timestamps = np.add.reduceat(timestamps, starts) / counts
+            values = np.add.reduceat(values, starts, axis=0) / counts[:, None]
+
+        return {
+            "interval": self.interval,
+            "timestamps": [int(t) for t in timestamps],
+            "series": {
+                name: np.round(values[:, i], 2).tolist()
+                for i, name in enumerate(HISTORY_FIELDS)
+            },
+        }
+
+
+system_sampler = SystemSampler()
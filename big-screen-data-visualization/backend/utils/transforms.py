@@ -0,0 +1,380 @@
+import hashlib
+import json
+import operator
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.query_result import QueryResult, value_type
+
+# 声明式数据变换：query_config["transform"] / 组件 config["transform"] 为步骤列表，
+# 在缓存的基础查询结果上按列向量化执行，多个组件共用一个查询、各自只拿到需要的数据。
+#   {"op": "filter", "column": "level", "operator": "in", "value": ["high", "critical"]}
+#   {"op": "group", "by": ["region"], "aggregates": [{"column": "value", "agg": "sum", "as": "total"}]}
+#   {"op": "sort", "by": "total", "desc": true}
+#   {"op": "top", "n": 5, "by": "total", "others": "其他"}
+#   {"op": "pivot", "index": "month", "columns": "category", "values": "value", "agg": "sum"}
+#   {"op": "percentage", "column": "total", "as": "percent", "decimals": 1}
+TRANSFORM_OPS = ["filter", "group", "sort", "top", "pivot", "percentage"]
+AGGREGATES = ["sum", "mean", "min", "max", "count"]
+MAX_TRANSFORM_STEPS = 16
+
+_COMPARATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+FILTER_OPERATORS = list(_COMPARATORS) + ["in", "not_in"]
+
+
+class TransformError(ValueError):
+    pass
+
+
+def transform_options(config: Any) -> List[Dict[str, Any]]:
+    if not isinstance(config, dict):
+        return []
+    steps = config.get("transform")
+    return steps if isinstance(steps, list) else []
+
+
+def transform_key(steps: Sequence[Dict[str, Any]]) -> str:
+    raw = json.dumps(steps, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _names(value: Any, field: str) -> List[str]:
+    names = [value] if isinstance(value, str) else value
+    if not isinstance(names, list) or not names or not all(isinstance(n, str) for n in names):
+        raise TransformError(f"'{field}' must be a column name or a list of column names")
+    return names
+
+
+def validate_transform(steps: Any) -> List[Dict[str, Any]]:
+    # 只检查结构，列名在执行时按实际结果检查
+    if not isinstance(steps, list):
+        raise TransformError("transform must be a list of steps")
+    if len(steps) > MAX_TRANSFORM_STEPS:
+        raise TransformError(f"transform allows at most {MAX_TRANSFORM_STEPS} steps")
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict) or step.get("op") not in TRANSFORM_OPS:
+            raise TransformError(f"Step {i}: op must be one of {', '.join(TRANSFORM_OPS)}")
+        op = step["op"]
+        if op == "filter":
+            if not isinstance(step.get("column"), str):
+                raise TransformError(f"Step {i}: filter requires 'column'")
+            if step.get("operator", "eq") not in FILTER_OPERATORS:
+                raise TransformError(f"Step {i}: operator must be one of {', '.join(FILTER_OPERATORS)}")
+            if step.get("operator") in ("in", "not_in") and not isinstance(step.get("value"), list):
+                raise TransformError(f"Step {i}: '{step['operator']}' requires a list value")
+        elif op == "group":
+            _names(step.get("by"), "by")
+            aggregates = step.get("aggregates")
+            if not isinstance(aggregates, list) or not all(
+                isinstance(a, dict) and a.get("agg", "sum") in AGGREGATES for a in aggregates
+            ):
+                raise TransformError(f"Step {i}: aggregates must be a list of {{column, agg, as}}")
+        elif op == "sort":
+            _names(step.get("by"), "by")
+        elif op == "top":
+            if not isinstance(step.get("n"), int) or step["n"] < 0:
+                raise TransformError(f"Step {i}: top requires a non-negative integer 'n'")
+        elif op == "pivot":
+            for field in ("index", "columns", "values"):
+                if not isinstance(step.get(field), str):
+                    raise TransformError(f"Step {i}: pivot requires '{field}'")
+            if step.get("agg", "sum") not in AGGREGATES:
+                raise TransformError(f"Step {i}: agg must be one of {', '.join(AGGREGATES)}")
+        elif op == "percentage":
+            if not isinstance(step.get("column"), str):
+                raise TransformError(f"Step {i}: percentage requires 'column'")
+    return steps
+
+
+def _to_float(value: Any) -> float:
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _numeric(values: np.ndarray) -> np.ndarray:
+    try:
+        # 纯数值列直接转换，避免逐个判断类型
+        return values.astype(np.float64)
+    except (TypeError, ValueError):
+        return np.fromiter((_to_float(v) for v in values), dtype=np.float64, count=len(values))
+
+
+def _is_numeric_column(values: np.ndarray) -> bool:
+    for v in values:
+        if v is not None:
+            return value_type(v) in ("integer", "number")
+    return False
+
+
+def _is_integer_column(values: np.ndarray) -> bool:
+    present = [v for v in values if v is not None]
+    return bool(present) and all(value_type(v) == "integer" for v in present)
+
+
+def _object_array(values: Sequence[Any]) -> np.ndarray:
+    # 逐元素填充，单元格为列表（如坐标）时不会被展开成二维数组
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def _from_float(values: np.ndarray, integer: bool = False) -> np.ndarray:
+    # NaN 输出为 None；整数列的聚合结果保持整数
+    missing = np.isnan(values)
+    out = (np.where(missing, 0, np.round(values)).astype(np.int64) if integer else values).astype(object)
+    out[missing] = None
+    return out
+
+
+def _factorize(values: np.ndarray) -> Tuple[np.ndarray, List[Any]]:
+    # 按首次出现顺序编码，分组与透视结果保持原始数据中的顺序
+    index: Dict[Any, int] = {}
+    try:
+        codes = np.fromiter(
+            (index.setdefault(v, len(index)) for v in values.tolist()),
+            dtype=np.int64,
+            count=len(values),
+        )
+    except TypeError:
+        raise TransformError("Cannot group by a column containing lists or objects")
+    return codes, list(index)
+
+
+def _densify(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # 将任意整数编码压缩为 0..k-1（按首次出现顺序），同时返回每组第一行的位置
+    _, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse], first[order]
+
+
+def _aggregate(agg: str, codes: np.ndarray, groups: int, values: Optional[np.ndarray]) -> np.ndarray:
+    if values is None:
+        return np.bincount(codes, minlength=groups).astype(np.float64)
+    valid = ~np.isnan(values)
+    counts = np.bincount(codes[valid], minlength=groups).astype(np.float64)
+    if agg == "count":
+        return counts
+    if agg in ("sum", "mean"):
+        sums = np.bincount(codes[valid], weights=values[valid], minlength=groups)
+        if agg == "sum":
+            # 与 mean/min/max 一致：没有非空值的分组为 null
+            sums[counts == 0] = np.nan
+            return sums
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / np.where(counts > 0, counts, 1), np.nan)
+    out = np.full(groups, np.inf if agg == "min" else -np.inf)
+    (np.minimum if agg == "min" else np.maximum).at(out, codes[valid], values[valid])
+    out[counts == 0] = np.nan
+    return out
+
+
+class _Frame:
+    __slots__ = ("columns", "data")
+
+    def __init__(self, columns: List[str], data: List[np.ndarray]):
+        self.columns = columns
+        self.data = data
+
+    @classmethod
+    def from_result(cls, result: QueryResult) -> "_Frame":
+        return cls(list(result.columns), [_object_array(values) for values in result.arrays()])
+
+    def __len__(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def column(self, name: str) -> np.ndarray:
+        try:
+            return self.data[self.columns.index(name)]
+        except ValueError:
+            raise TransformError(f"Unknown column: {name}")
+
+    def take(self, indexer: np.ndarray) -> "_Frame":
+        return _Frame(self.columns, [values[indexer] for values in self.data])
+
+    def set(self, name: str, values: np.ndarray) -> None:
+        if name in self.columns:
+            self.data[self.columns.index(name)] = values
+        else:
+            self.columns.append(name)
+            self.data.append(values)
+
+    def to_result(self) -> QueryResult:
+        return QueryResult(self.columns, list(zip(*(values.tolist() for values in self.data))))
+
+
+def _filter(frame: _Frame, step: Dict[str, Any]) -> _Frame:
+    values = frame.column(step["column"])
+    op = step.get("operator", "eq")
+    target = step.get("value")
+    if op in ("in", "not_in"):
+        members = set(v for v in target if not isinstance(v, (list, dict)))
+        mask = np.fromiter((v in members for v in values.tolist()), dtype=bool, count=len(values))
+        return frame.take(~mask if op == "not_in" else mask)
+
+    compare = _COMPARATORS[op]
+    if isinstance(target, (int, float)) and not isinstance(target, bool):
+        with np.errstate(invalid="ignore"):
+            return frame.take(compare(_numeric(values), float(target)))
+
+    # 非数值比较按字符串进行，日期时间按 ISO 格式比较
+    present = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+    text = np.asarray(
+        [v.isoformat() if isinstance(v, (date, datetime)) else str(v) for v in values[present]],
+        dtype=str,
+    )
+    mask = np.full(len(values), op == "ne" and target is not None)
+    if target is None:
+        mask = ~present if op == "eq" else present if op == "ne" else mask
+    elif len(text):
+        mask[present] = compare(text, str(target))
+    return frame.take(mask)
+
+
+def _group_codes(frame: _Frame, names: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    codes = np.zeros(len(frame), dtype=np.int64)
+    for name in names:
+        column_codes, uniques = _factorize(frame.column(name))
+        # 逐列合并后立即压缩，避免多列组合时编码溢出
+        codes, _ = _densify(codes * max(len(uniques), 1) + column_codes)
+    return _densify(codes)
+
+
+def _group(frame: _Frame, step: Dict[str, Any]) -> _Frame:
+    names = _names(step["by"], "by")
+    codes, first = _group_codes(frame, names)
+    groups = len(first)
+    columns = list(names)
+    data = [frame.column(name)[first] for name in names]
+    for aggregate in step["aggregates"]:
+        agg = aggregate.get("agg", "sum")
+        source = aggregate.get("column")
+        values = None if source is None else frame.column(source)
+        result = _aggregate(agg, codes, groups, None if values is None else _numeric(values))
+        integer = agg == "count" or (
+            agg in ("sum", "min", "max") and values is not None and _is_integer_column(values)
+        )
+        columns.append(aggregate.get("as") or (f"{source}_{agg}" if source else "count"))
+        data.append(_from_float(result, integer))
+    return _Frame(columns, data)
+
+
+def _sort_order(frame: _Frame, names: List[str], desc: Any) -> np.ndarray:
+    descending = desc if isinstance(desc, list) else [bool(desc)] * len(names)
+    keys: List[np.ndarray] = []
+    for name, reverse in zip(names, descending + [False] * len(names)):
+        values = frame.column(name)
+        if _is_numeric_column(values):
+            key = _numeric(values)
+        else:
+            present = [v for v in values.tolist() if v is not None]
+            try:
+                ranks = {v: i for i, v in enumerate(sorted(set(present)))}
+            except TypeError:
+                ranks = {v: i for i, v in enumerate(sorted(set(present), key=str))}
+            key = np.fromiter(
+                (np.nan if v is None else ranks[v] for v in values.tolist()),
+                dtype=np.float64,
+                count=len(values),
+            )
+        missing = np.isnan(key)
+        key = np.where(missing, 0, -key if reverse else key)
+        # 空值始终排在最后
+        keys.append(missing)
+        keys.append(key)
+    # np.lexsort 以最后一个键为主键，且排序稳定
+    return np.lexsort(keys[::-1])
+
+
+def _sort(frame: _Frame, step: Dict[str, Any]) -> _Frame:
+    names = _names(step["by"], "by")
+    return frame.take(_sort_order(frame, names, step.get("desc", False)))
+
+
+def _top(frame: _Frame, step: Dict[str, Any]) -> _Frame:
+    n = step["n"]
+    if step.get("by") is not None:
+        frame = frame.take(_sort_order(frame, _names(step["by"], "by"), step.get("desc", True)))
+    if len(frame) <= n:
+        return frame
+    head = frame.take(np.arange(n))
+    others = step.get("others")
+    if not others:
+        return head
+    # 其余行合并为一行：数值列求和，第一个非数值列填入 others 标签
+    rest = frame.take(np.arange(n, len(frame)))
+    labelled = False
+    for i, values in enumerate(rest.data):
+        if _is_numeric_column(values):
+            total = np.nansum(_numeric(values))
+            row = int(total) if _is_integer_column(values) else float(total)
+        elif not labelled:
+            row, labelled = others, True
+        else:
+            row = None
+        head.data[i] = np.append(head.data[i], np.array([row], dtype=object))
+    return head
+
+
+def _pivot(frame: _Frame, step: Dict[str, Any]) -> _Frame:
+    index_codes, index_values = _factorize(frame.column(step["index"]))
+    column_codes, column_values = _factorize(frame.column(step["columns"]))
+    rows, cols = len(index_values), len(column_values)
+    agg = step.get("agg", "sum")
+    values = frame.column(step["values"])
+    cells = _aggregate(agg, index_codes * cols + column_codes, rows * cols, _numeric(values))
+    # 透视后没有数据的单元格为 None
+    present = np.bincount(index_codes * cols + column_codes, minlength=rows * cols) > 0
+    cells = np.where(present, cells, np.nan).reshape(rows, cols)
+    integer = agg == "count" or (agg in ("sum", "min", "max") and _is_integer_column(values))
+    return _Frame(
+        [step["index"]] + [str(c) for c in column_values],
+        [_object_array(index_values)] + [_from_float(cells[:, j], integer) for j in range(cols)],
+    )
+
+
+def _percentage(frame: _Frame, step: Dict[str, Any]) -> _Frame:
+    column = step["column"]
+    values = _numeric(frame.column(column))
+    total = np.nansum(values)
+    decimals = int(step.get("decimals", 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent = np.round(values / total * 100, decimals) if total else np.full(len(values), np.nan)
+    frame = _Frame(list(frame.columns), list(frame.data))
+    frame.set(step.get("as") or f"{column}_percent", _from_float(percent))
+    return frame
+
+
+_STEPS: Dict[str, Callable[[_Frame, Dict[str, Any]], _Frame]] = {
+    "filter": _filter,
+    "group": _group,
+    "sort": _sort,
+    "top": _top,
+    "pivot": _pivot,
+    "percentage": _percentage,
+}
+
+
+def transform_result(result: QueryResult, steps: List[Dict[str, Any]]) -> QueryResult:
+    validate_transform(steps)
+    if not steps:
+        return result
+    frame = _Frame.from_result(result)
+    for step in steps:
+        frame = _STEPS[step["op"]](frame, step)
+    return frame.to_result()
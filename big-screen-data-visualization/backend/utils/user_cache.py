@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import models
+
+# 已认证用户的进程内缓存：用户很少变化，按用户名缓存不可变快照，避免每个请求查库。
+# 多进程部署时其他进程最多在 TTL 内看到旧数据；密码修改通过 token_version 立即吊销令牌。
+USER_CACHE_TTL = 60  # seconds
+USER_CACHE_MAX_ENTRIES = 1024
+
+_SNAPSHOT_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "full_name",
+    "is_active",
+    "is_admin",
+    "token_version",
+    "created_at",
+    "updated_at",
+)
+
+
+class UserSnapshot:
+    __slots__ = _SNAPSHOT_FIELDS
+
+    def __init__(self, user: models.User):
+        for field in _SNAPSHOT_FIELDS:
+            object.__setattr__(self, field, getattr(user, field))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("UserSnapshot is immutable")
+
+
+class UserCache:
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[UserSnapshot, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[UserSnapshot]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[1] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self, username: str) -> int:
+        # 查库前读取，写回时比较：查库期间发生失效则不缓存旧数据
+        with self._lock:
+            return self._generations.get(username, 0)
+
+    def set(self, user: models.User, generation: int) -> UserSnapshot:
+        snapshot = UserSnapshot(user)
+        with self._lock:
+            if self._generations.get(snapshot.username, 0) != generation:  # type: ignore
+                return snapshot
+            self._entries[snapshot.username] = (snapshot, time.monotonic() + self.ttl)  # type: ignore
+            self._entries.move_to_end(snapshot.username)  # type: ignore
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, username: Optional[str]) -> None:
+        if username is None:
+            return
+        with self._lock:
+            self._entries.pop(username, None)
+            self._generations[username] = self._generations.get(username, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
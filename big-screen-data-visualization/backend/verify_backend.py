@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from database import engine, SessionLocal
@@ -43,8 +45,46 @@ def test_system_stats_and_alarms():
     assert response.json()["is_read"] is True
 
 
+def test_ndjson_error_trailer():
+    from utils.db_engine import encode_ndjson
+
+    def rows():
+        yield {"id": 1}
+        raise RuntimeError("connection lost")
+
+    lines = b"".join(encode_ndjson(rows())).splitlines()
+    assert len(lines) == 2
+    meta = json.loads(lines[-1])["_meta"]
+    assert meta["rows"] == 1
+    assert meta["truncated"] is True
+    assert meta["error"] == "connection lost"
+
+
+def test_group_sum_of_nulls_is_null():
+    from utils.query_result import QueryResult
+    from utils.transforms import transform_result
+
+    result = QueryResult(["region", "value"], [("east", None), ("east", None), ("west", 3)])
+    grouped = transform_result(
+        result,
+        [
+            {
+                "op": "group",
+                "by": ["region"],
+                "aggregates": [{"column": "value", "agg": "sum", "as": "total"}],
+            }
+        ],
+    )
+    assert grouped.records() == [
+        {"region": "east", "total": None},
+        {"region": "west", "total": 3},
+    ]
+
+
 if __name__ == "__main__":
     # Manual run if pytest is not available
     setup_module(None)
     test_system_stats_and_alarms()
+    test_ndjson_error_trailer()
+    test_group_sum_of_nulls_is_null()
     print("Verification Successful: Backend API flows are correct.")
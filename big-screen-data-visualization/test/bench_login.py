@@ -0,0 +1,106 @@
+"""登录吞吐基准：模拟交接班时大量操作员同时登录。
+
+同时测量 /health 的响应延迟，用来观察 bcrypt 是否阻塞事件循环。
+--inline 在事件循环中直接计算 bcrypt（改造前的行为），用于对比。
+
+    python test/bench_login.py --users 50
+    python test/bench_login.py --users 50 --inline
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+# 在临时目录中创建元数据库，不影响本地的 situational_dashboard.db
+os.chdir(tempfile.mkdtemp())
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from utils import auth  # noqa: E402
+
+PASSWORD = "operator-password"
+
+
+def create_users(count):
+    hashed = auth.get_password_hash(PASSWORD)
+    with SessionLocal() as db:
+        for i in range(count):
+            db.add(
+                models.User(
+                    username=f"operator{i}",
+                    email=f"operator{i}@example.com",
+                    hashed_password=hashed,
+                )
+            )
+        db.commit()
+
+
+async def probe_health(client, stop, latencies):
+    # 每 10ms 请求一次 /health，记录两次请求完成之间的间隔（事件循环被阻塞时间隔变大）
+    last = time.perf_counter()
+    while not stop.is_set():
+        await client.get("/health")
+        now = time.perf_counter()
+        latencies.append(now - last)
+        last = now
+        await asyncio.sleep(0.01)
+
+
+async def login(client, i):
+    response = await client.post(
+        "/api/users/login", data={"username": f"operator{i}", "password": PASSWORD}
+    )
+    return response.status_code
+
+
+async def run(users):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        latencies = []
+        probe = asyncio.create_task(probe_health(client, stop, latencies))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(login(client, i) for i in range(users)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    latencies.sort()
+    ok = sum(1 for s in statuses if s == 200)
+    print(
+        f"logins={users} ok={ok} elapsed={elapsed:.2f}s "
+        f"throughput={users / elapsed:.1f}/s "
+        f"health interval p50={latencies[len(latencies) // 2] * 1000:.1f}ms "
+        f"max={latencies[-1] * 1000:.1f}ms samples={len(latencies)}"
+    )
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument(
+        "--inline", action="store_true", help="verify bcrypt on the event loop"
+    )
+    args = parser.parse_args()
+
+    if args.inline:
+
+        async def inline(fn, *fn_args):
+            return fn(*fn_args)
+
+        auth._run_password_task = inline
+
+    create_users(args.users)
+    asyncio.run(run(args.users))
+
+
+if __name__ == "__main__":
+    main_()
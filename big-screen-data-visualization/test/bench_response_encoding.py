@@ -0,0 +1,127 @@
+"""响应编码基准：使用 init_smart_city.py 的智慧城市大屏数据，对比编码耗时与传输字节数。
+
+编码耗时对比改造前的路径（response_model 校验 + jsonable_encoder + 标准库 json）
+与 orjson 直接编码；传输字节数按 Accept-Encoding 分别请求 identity/gzip/br/zstd。
+--repeat 将每个数据集的 mock 数据重复 N 次，模拟更大的结果集。
+
+    python test/bench_response_encoding.py
+    python test/bench_response_encoding.py --repeat 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(TEST_DIR, "..", "backend")))
+sys.path.insert(0, TEST_DIR)
+# 在临时目录中创建元数据库，不影响本地的 situational_dashboard.db
+os.chdir(tempfile.mkdtemp())
+
+import httpx  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from sqlalchemy.orm.attributes import flag_modified  # noqa: E402
+
+import main  # noqa: E402
+import models  # noqa: E402
+import schemas  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from init_smart_city import init_smart_city_data  # noqa: E402
+from utils.compression import available_encodings  # noqa: E402
+from utils.json_response import dump_json, trusted_dict  # noqa: E402
+
+
+def load_fixtures(repeat):
+    init_smart_city_data()
+    with SessionLocal() as db:
+        if repeat > 1:
+            for dataset in db.query(models.Dataset).all():
+                mock_data = dataset.query_config.get("mock_data")  # type: ignore
+                if isinstance(mock_data, list):
+                    dataset.query_config["mock_data"] = mock_data * repeat  # type: ignore
+                    flag_modified(dataset, "query_config")
+            db.commit()
+        dashboard = db.query(models.Dashboard).filter(
+            models.Dashboard.name == "智慧城市可视化大屏"
+        ).first()
+        return dashboard.id  # type: ignore
+
+
+def timed(fn, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, len(body)
+
+
+def bench_encoding(dashboard_id, rounds):
+    with SessionLocal() as db:
+        dashboard = db.get(models.Dashboard, dashboard_id)
+        data = {
+            w.dataset_id: db.get(models.Dataset, w.dataset_id).query_config.get("mock_data")  # type: ignore
+            for w in dashboard.widgets  # type: ignore
+            if w.dataset_id is not None
+        }
+        render = {"dashboard": dashboard, "data": data, "errors": {}}
+
+        def stdlib():
+            validated = schemas.DashboardRender.model_validate(
+                {"dashboard": schemas.Dashboard.model_validate(dashboard), "data": data, "errors": {}}
+            )
+            return json.dumps(
+                jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+
+        def fast():
+            return dump_json(
+                {"dashboard": trusted_dict(render["dashboard"], schemas.Dashboard), "data": data, "errors": {}}
+            )
+
+        for name, fn in (("stdlib+validate", stdlib), ("orjson+trusted", fast)):
+            ms, size = timed(fn, rounds)
+            print(f"  encode {name:<16} {ms:8.2f}ms  {size} bytes")
+
+
+async def bench_wire(dashboard_id, rounds):
+    transport = httpx.ASGITransport(app=main.app)
+    paths = [
+        "/api/dashboards/",
+        f"/api/dashboards/{dashboard_id}",
+        f"/api/dashboards/{dashboard_id}/render",
+        "/api/datasets/",
+    ]
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in paths:
+            print(f"  {path}")
+            for encoding in ["identity"] + available_encodings():
+                best = float("inf")
+                wire = 0
+                for _ in range(rounds):
+                    started = time.perf_counter()
+                    async with client.stream(
+                        "GET", path, headers={"Accept-Encoding": encoding}
+                    ) as response:
+                        wire = sum([len(chunk) async for chunk in response.aiter_raw()])
+                    best = min(best, time.perf_counter() - started)
+                print(f"    {encoding:<9} {wire:>9} bytes  {best * 1000:8.2f}ms")
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    dashboard_id = load_fixtures(args.repeat)
+    print(f"smart city dashboard, mock data x{args.repeat}")
+    bench_encoding(dashboard_id, args.rounds)
+    asyncio.run(bench_wire(dashboard_id, args.rounds))
+
+
+if __name__ == "__main__":
+    main_()
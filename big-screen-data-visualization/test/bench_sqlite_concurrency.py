@@ -0,0 +1,146 @@
+"""元数据库并发基准：写入告警的同时测量读吞吐。
+
+对比默认配置（rollback journal、默认连接参数）与 database.py 中的调优配置
+（WAL、synchronous=NORMAL、busy_timeout、读写分离连接池）。
+
+    cd backend
+    python ../test/bench_sqlite_concurrency.py --seconds 10 --readers 8 --writers 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from sqlalchemy import create_engine, func  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import models  # noqa: E402
+from database import create_sqlite_engine  # noqa: E402
+
+
+def build_engines(path, tuned):
+    url = f"sqlite:///{path}"
+    if tuned:
+        return create_sqlite_engine(url), create_sqlite_engine(url, read_only=True)
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    return engine, engine
+
+
+def seed(engine, dashboards=20, widgets=12):
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        for d in range(dashboards):
+            dashboard = models.Dashboard(
+                name=f"dashboard-{d}", title=f"Dashboard {d}", layout_config={"cols": 24}
+            )
+            db.add(dashboard)
+            db.flush()
+            for w in range(widgets):
+                db.add(
+                    models.Widget(
+                        dashboard_id=dashboard.id,
+                        type="chart",
+                        config={"title": f"widget-{w}"},
+                        position={"x": w, "y": 0, "w": 4, "h": 3},
+                    )
+                )
+        db.commit()
+
+
+def run(tuned, seconds, readers, writers):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    write_engine, read_engine = build_engines(path, tuned)
+    seed(write_engine)
+    WriteSession = sessionmaker(bind=write_engine)
+    ReadSession = sessionmaker(bind=read_engine)
+
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def reader(worker):
+        local_reads = local_errors = 0
+        local_latencies = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with ReadSession() as db:
+                    dashboard = db.get(models.Dashboard, worker % 20 + 1)
+                    list(dashboard.widgets)  # type: ignore
+                    db.query(models.Alarm).order_by(models.Alarm.created_at.desc()).limit(20).all()
+                    db.query(func.count(models.Alarm.id)).filter(
+                        models.Alarm.is_read.is_(False)
+                    ).scalar()
+                local_reads += 1
+                local_latencies.append(time.perf_counter() - started)
+            except Exception:
+                local_errors += 1
+        with lock:
+            counts["reads"] += local_reads
+            counts["read_errors"] += local_errors
+            latencies.extend(local_latencies)
+
+    def writer(worker):
+        local_writes = local_errors = 0
+        while not stop.is_set():
+            try:
+                with WriteSession() as db:
+                    db.add(
+                        models.Alarm(
+                            level="warning",
+                            message=f"writer {worker} alarm",
+                            source="bench",
+                            created_at=datetime.utcnow(),
+                        )
+                    )
+                    db.commit()
+                local_writes += 1
+            except Exception:
+                local_errors += 1
+        with lock:
+            counts["writes"] += local_writes
+            counts["write_errors"] += local_errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0
+    return {
+        "reads/s": round(counts["reads"] / seconds, 1),
+        "writes/s": round(counts["writes"] / seconds, 1),
+        "read p99 ms": round(p99, 2),
+        "read errors": counts["read_errors"],
+        "write errors": counts["write_errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    for name, tuned in (("default", False), ("tuned", True)):
+        result = run(tuned, args.seconds, args.readers, args.writers)
+        print(f"{name:>8}: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,7 +17,15 @@ def run_init_on_db(db_path):
     print(f"Initializing standardized dashboards in {db_path}...")
 
     # 1. Clean up old data
-    tables = ["users", "datasources", "datasets", "dashboards", "widgets", "alarms"]
+    tables = [
+        "users",
+        "datasources",
+        "datasets",
+        "dashboards",
+        "widgets",
+        "alarms",
+        "alarm_counters",
+    ]
     for table in tables:
         try:
             cursor.execute(f"DELETE FROM {table}")